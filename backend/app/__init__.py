@@ -2,10 +2,27 @@ import os
 from flask import Flask, send_from_directory, send_file, request, jsonify
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as BaseSession
 
-db = SQLAlchemy()
 
-def create_app():
+class Session(BaseSession):
+    """Session whose commit() only flushes while commits are deferred.
+    
+    See app.unit_of_work: the whole request (or batch) then commits once.
+    """
+    
+    def commit(self):
+        if self.info.get('defer_commits'):
+            self.flush()
+            self.info['commit_requested'] = True
+            return
+        super().commit()
+
+
+db = SQLAlchemy(session_options={'class_': Session})
+
+def create_app(config=None):
+    """Build the app; ``config`` overrides the defaults below (e.g. another database for tests)."""
     # Setup static folder path
     basedir = os.path.abspath(os.path.dirname(__file__))
     static_folder = os.path.join(basedir, '..', 'static')
@@ -25,10 +42,65 @@ def create_app():
     app.config['ALLOWED_IMAGE_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     app.config['ALLOWED_VIDEO_EXTENSIONS'] = {'mp4', 'webm', 'mov'}
     
+    # Activity log writer: queued entries, entries per batch insert, seconds
+    # before a partial batch is written, seconds to wait for room when full
+    app.config['ACTIVITY_LOG_QUEUE_SIZE'] = 10000
+    app.config['ACTIVITY_LOG_BATCH_SIZE'] = 200
+    app.config['ACTIVITY_LOG_FLUSH_INTERVAL'] = 2
+    app.config['ACTIVITY_LOG_FULL_TIMEOUT'] = 0.05
+    # Retention, enforced hourly: entries by age and by count, daily counts by age
+    app.config['ACTIVITY_LOG_RETENTION_DAYS'] = 90
+    app.config['ACTIVITY_LOG_MAX_ROWS'] = 50000
+    app.config['ACTIVITY_LOG_ROLLUP_RETENTION_DAYS'] = 730
+    
+    # Chunked uploads: largest (and default) chunk, and seconds before an idle upload is dropped
+    app.config['UPLOAD_CHUNK_SIZE'] = 8 * 1024 * 1024
+    app.config['UPLOAD_SESSION_TTL'] = 24 * 3600
+    
+    # Background jobs: worker pool size, seconds between polls, tries per job, seconds before
+    # the first retry (doubled for each further one), days finished jobs are kept
+    app.config['JOB_WORKERS'] = 2
+    app.config['JOB_POLL_INTERVAL'] = 10
+    app.config['JOB_MAX_ATTEMPTS'] = 3
+    app.config['JOB_RETRY_DELAY'] = 30
+    app.config['JOB_RETENTION'] = 7
+    
+    # Video renditions (H.264) produced after upload for screens that struggle with the original
+    app.config['TRANSCODE_ENABLED'] = os.environ.get('SCREENSPLASH_TRANSCODE', '1') == '1'
+    app.config['TRANSCODE_PROFILES'] = [
+        {'name': '1080p', 'width': 1920, 'height': 1080, 'bitrate': 5000000},
+        {'name': '720p', 'width': 1280, 'height': 720, 'bitrate': 2500000},
+    ]
+    
+    # Image renditions: display sizes large images are scaled down to, and formats to encode them in
+    app.config['IMAGE_RENDITION_SIZES'] = [
+        {'name': '2160p', 'width': 3840, 'height': 2160},
+        {'name': '1080p', 'width': 1920, 'height': 1080},
+        {'name': '720p', 'width': 1280, 'height': 720},
+    ]
+    app.config['IMAGE_RENDITION_FORMATS'] = ['image/jpeg', 'image/webp', 'image/avif']
+    
+    # Media delivery: None (Flask sends files), 'x-sendfile' (Apache, lighttpd) or
+    # 'x-accel-redirect' (nginx, with an internal location at MEDIA_ACCEL_PREFIX aliasing UPLOAD_FOLDER)
+    app.config['MEDIA_OFFLOAD'] = os.environ.get('SCREENSPLASH_MEDIA_OFFLOAD') or None
+    app.config['MEDIA_ACCEL_PREFIX'] = '/protected-media/'
+    
+    # Screen heartbeats: seconds between batched writes, and before a screen counts as offline;
+    # most screens kept in memory
+    app.config['SCREEN_FLUSH_INTERVAL'] = 30
+    app.config['SCREEN_OFFLINE_AFTER'] = 90
+    app.config['SCREEN_REGISTRY_SIZE'] = 1000
+    
+    if config:
+        app.config.update(config)
+    
     # Initialize extensions
     CORS(app, origins="*", supports_credentials=True)
     db.init_app(app)
     
+    from app import unit_of_work
+    unit_of_work.init_app(app)
+    
     from sqlalchemy import event
     from sqlalchemy.engine import Engine
 
@@ -45,6 +117,9 @@ def create_app():
     os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'images'), exist_ok=True)
     os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'videos'), exist_ok=True)
     os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'thumbnails'), exist_ok=True)
+    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'uploads'), exist_ok=True)
+    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'renditions'), exist_ok=True)
+    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'sprites'), exist_ok=True)
     
     # Register blueprints
     from app.api.assets import assets_bp
@@ -54,6 +129,8 @@ def create_app():
     from app.api.player import player_bp
     from app.api.widgets import widgets_bp
     from app.api.auth import auth_bp
+    from app.api.jobs import jobs_bp
+    from app.api.batch import batch_bp
     
     app.register_blueprint(assets_bp, url_prefix='/api/assets')
     app.register_blueprint(playlists_bp, url_prefix='/api/playlists')
@@ -62,11 +139,18 @@ def create_app():
     app.register_blueprint(player_bp, url_prefix='/api/player')
     app.register_blueprint(widgets_bp, url_prefix='/api/widgets')
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+    app.register_blueprint(batch_bp, url_prefix='/api/batch')
     
     # Servir les fichiers médias (images, vidéos)
     @app.route('/media/<path:path>')
     def serve_media(path):
-        return send_from_directory(app.config['UPLOAD_FOLDER'], path)
+        from werkzeug.security import safe_join
+        from app.media_store import send_media, content_etag, is_content_addressed
+        if safe_join(app.config['UPLOAD_FOLDER'], path) is None:
+            return jsonify({"error": "Resource not found"}), 404
+        # Les fichiers nommés d'après leur hash ne changent jamais
+        return send_media(path, etag=content_etag(path), immutable=is_content_addressed(path))
 
     # Route de base (sert le dashboard)
     @app.route('/')
@@ -101,5 +185,33 @@ def create_app():
     with app.app_context():
         db.create_all()
     
+    from app import playlist_totals  # keeps playlist totals in step with their items
+    
+    @app.cli.command('reconcile-playlists')
+    def reconcile_playlists():
+        """Recompute stored playlist totals and repair any drift."""
+        drifted = playlist_totals.reconcile()
+        print(f"Repaired {len(drifted)} playlist(s): {drifted}" if drifted else "All playlist totals are correct")
+    
+    # Background tasks
+    from app import background
+    from app.screen_registry import screen_registry
+    from app.api.assets import expire_uploads
+    from app.jobs import job_queue
+    from app.thumbnail_sprites import sprite_cache
+    from app.activity_log import activity_log, compact as compact_activity_log
+    from app import media_processing  # registers the job handlers
+    background.every(app, app.config['SCREEN_FLUSH_INTERVAL'], screen_registry.flush, 'flush_screens')
+    background.on_shutdown(app, screen_registry.flush)
+    background.every(app, 3600, expire_uploads, 'expire_uploads')
+    background.every(app, 3600, job_queue.prune, 'prune_jobs')
+    background.every(app, 3600, lambda: sprite_cache.prune(24 * 3600), 'prune_sprites')
+    background.every(app, 3600, compact_activity_log, 'compact_activity_log')
+    background.on_shutdown(app, job_queue.stop)
+    background.on_shutdown(app, activity_log.flush)
+    background.start()
+    job_queue.start(app)
+    activity_log.start(app)
+    
     return app
 
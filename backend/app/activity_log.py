@@ -0,0 +1,150 @@
+"""Buffered, asynchronous writer for the activity log.
+
+ActivityLog.log() only puts the entry on a bounded in-memory queue (once
+the request's unit of work has committed, so rolled back work is never
+logged). A writer thread inserts queued entries in batches, one
+executemany and one commit per ACTIVITY_LOG_BATCH_SIZE entries or every
+ACTIVITY_LOG_FLUSH_INTERVAL seconds, whichever comes first; whatever is
+left is written at shutdown. The same commit adds the entries to the
+per-day, per-action counts in activity_log_daily.
+
+When the queue is full, log() waits up to ACTIVITY_LOG_FULL_TIMEOUT seconds
+for room and then drops the entry: audit logging must never stall a burst
+of admin writes. Dropped entries are counted and reported on the console.
+
+compact() enforces retention: entries older than ACTIVITY_LOG_RETENTION_DAYS
+and all but the newest ACTIVITY_LOG_MAX_ROWS are deleted; daily counts are
+kept for ACTIVITY_LOG_ROLLUP_RETENTION_DAYS.
+"""
+import queue
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import insert, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import db
+from app.models import ActivityLog, ActivityLogDaily
+
+# Rows deleted per statement while compacting, to keep write locks short
+COMPACT_CHUNK = 5000
+
+
+class ActivityLogWriter:
+    """Queues activity log entries and writes them in batches."""
+
+    def __init__(self):
+        self._queue = None
+        self._app = None
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._dropped = 0
+
+    def start(self, app):
+        if self._app is not None:
+            return
+        self._app = app
+        self._queue = queue.Queue(maxsize=app.config['ACTIVITY_LOG_QUEUE_SIZE'])
+        threading.Thread(target=self._write_loop, name='activity-log', daemon=True).start()
+
+    def put(self, entry):
+        """Queue an entry (ActivityLog column values); False if it had to be dropped."""
+        if self._queue is None:
+            # Not started (e.g. a maintenance script): write it right away
+            self._write([entry])
+            return True
+        try:
+            self._queue.put(entry, timeout=self._app.config['ACTIVITY_LOG_FULL_TIMEOUT'])
+        except queue.Full:
+            self._dropped += 1
+            return False
+        if self._queue.qsize() >= self._app.config['ACTIVITY_LOG_BATCH_SIZE']:
+            self._wakeup.set()
+        return True
+
+    def _write_loop(self):
+        while True:
+            # A full batch wakes the writer early; otherwise write what is there
+            self._wakeup.wait(self._app.config['ACTIVITY_LOG_FLUSH_INTERVAL'])
+            self._wakeup.clear()
+            try:
+                with self._app.app_context():
+                    self.flush()
+            except Exception as e:
+                print(f"Error writing activity log: {e}")
+
+    def flush(self):
+        """Write everything queued so far, a batch at a time (also at shutdown)."""
+        if self._queue is None:
+            return
+        batch_size = self._app.config['ACTIVITY_LOG_BATCH_SIZE']
+        with self._flush_lock:
+            while True:
+                entries = []
+                try:
+                    while len(entries) < batch_size:
+                        entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    pass
+                if not entries:
+                    return
+                self._write(entries)
+
+    def _write(self, entries):
+        db.session.execute(insert(ActivityLog), entries)
+        # Per-day counts go in the same commit
+        counts = Counter((e['created_at'].date(), e['action']) for e in entries)
+        stmt = sqlite_insert(ActivityLogDaily)
+        db.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=['day', 'action'],
+                set_={'count': ActivityLogDaily.count + stmt.excluded.count}
+            ),
+            [{'day': day, 'action': action, 'count': n} for (day, action), n in counts.items()]
+        )
+        db.session.commit()
+        if self._dropped:
+            dropped, self._dropped = self._dropped, 0
+            print(f"Activity log queue full: dropped {dropped} entries")
+
+
+activity_log = ActivityLogWriter()
+
+
+def entry(action, details=None, entity_type=None, entity_id=None):
+    """Column values of an activity log entry stamped now."""
+    return {
+        'action': action,
+        'details': details,
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'created_at': datetime.utcnow()
+    }
+
+
+def compact():
+    """Delete activity log entries beyond the retention limits; returns how many."""
+    config = current_app.config
+    deleted = 0
+    
+    # Entries past the row cap: everything up to the newest one that doesn't fit
+    conditions = [ActivityLog.created_at < datetime.utcnow() - timedelta(days=config['ACTIVITY_LOG_RETENTION_DAYS'])]
+    last_over_cap = db.session.query(ActivityLog.id).order_by(ActivityLog.id.desc())\
+        .offset(config['ACTIVITY_LOG_MAX_ROWS']).limit(1).scalar()
+    if last_over_cap is not None:
+        conditions.append(ActivityLog.id <= last_over_cap)
+    
+    while True:
+        ids = select(ActivityLog.id).where(or_(*conditions)).limit(COMPACT_CHUNK)
+        count = ActivityLog.query.filter(ActivityLog.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += count
+        if count < COMPACT_CHUNK:
+            break
+    
+    rollup_cutoff = datetime.utcnow().date() - timedelta(days=config['ACTIVITY_LOG_ROLLUP_RETENTION_DAYS'])
+    ActivityLogDaily.query.filter(ActivityLogDaily.day < rollup_cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
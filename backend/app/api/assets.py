@@ -1,13 +1,28 @@
-import os
 import uuid
-from flask import Blueprint, request, jsonify, current_app, send_from_directory
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
-from PIL import Image
 from app import db
-from app.models import Asset, ActivityLog, SystemConfig
+from sqlalchemy.dialects.sqlite import insert
+from app.models import Asset, ActivityLog, SystemConfig, UploadSession, UploadChunk, MediaInfo
+from app.jobs import job_queue
+from app.media_processing import apply_media_info, queue_renditions
+from app.screen_registry import screen_registry
+from app.media_store import (
+    save_stream, commit_file, discard, content_path, find_duplicate, unreferenced, remove_files,
+    hash_file, media_path, claim_file, release_file, link_copy, preallocate, write_at, sniff_file, send_media, content_etag, MIME_EXTENSIONS
+)
+from app.media_index import media_index
+from app.asset_counts import asset_counts
+from app.pagination import after_cursor, newest_first, encode_cursor
+from app.unit_of_work import after_commit, after_rollback
+from app.thumbnail_sprites import sprite_cache
 
 assets_bp = Blueprint('assets', __name__)
 
+# Image formats served only to clients that ask for them, best first
+NEGOTIATED_IMAGE_TYPES = ('image/avif', 'image/webp')
+
 def allowed_file(filename, file_type):
     """Check if file extension is allowed."""
     ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
@@ -26,77 +41,127 @@ def get_file_type(filename):
         return 'video'
     return None
 
-def generate_thumbnail(filepath, asset_type):
-    """Generate thumbnail for image/video."""
-    thumbnails_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'thumbnails')
-    if not os.path.exists(thumbnails_dir):
-        os.makedirs(thumbnails_dir)
-        
-    thumb_filename = f"thumb_{uuid.uuid4().hex}.jpg"
-    thumb_path = os.path.join(thumbnails_dir, thumb_filename)
+def sniffed_file_type(mime_type):
+    """'image' or 'video' for a sniffed mime type this install accepts, else None."""
+    ext = MIME_EXTENSIONS.get(mime_type)
+    return get_file_type(f"file.{ext}") if ext else None
+
+
+def build_file_asset(tmp_path, content_hash, file_size, mime_type, name, duration):
+    """Move a hashed temp file into the content store and return its new Asset.
+    
+    ``mime_type`` is the sniffed one, which must be accepted (see
+    sniffed_file_type). Identical content already stored is shared instead of
+    stored twice. The asset is added to the session, with its processing job
+    when it needs one.
+    """
+    file_type = sniffed_file_type(mime_type)
+    ext = MIME_EXTENSIONS[mime_type]
+    duplicate = find_duplicate(content_hash, file_type)
+    if duplicate:
+        # Identical content already stored: share its file and thumbnail
+        discard(tmp_path)
+        path = duplicate.path
+    else:
+        subfolder = 'images' if file_type == 'image' else 'videos'
+        path = content_path(subfolder, content_hash, ext)
+        commit_file(tmp_path, path)
     
-    try:
-        if asset_type == 'image':
-            with Image.open(filepath) as img:
-                img.thumbnail((300, 300))
-                if img.mode in ('RGBA', 'P'):
-                    img = img.convert('RGB')
-                img.save(thumb_path, 'JPEG', quality=85)
-            return f"thumbnails/{thumb_filename}"
-            
-        elif asset_type == 'video':
-            # Extract frame at 1 second
-            cmd = [
-                'ffmpeg', '-i', filepath,
-                '-ss', '00:00:01',
-                '-vframes', '1',
-                '-q:v', '2',
-                '-s', '320x180',
-                '-f', 'image2',
-                thumb_path,
-                '-y'
-            ]
-            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-            return f"thumbnails/{thumb_filename}"
-            
-    except Exception as e:
-        print(f"Error generating thumbnail: {e}")
-    return None
+    asset = Asset(
+        name=name,
+        type=file_type,
+        path=path,
+        duration=duration,
+        mime_type=mime_type,
+        file_size=file_size,
+        content_hash=content_hash,
+        is_active=True
+    )
+    info = db.session.get(MediaInfo, content_hash)
+    if info and duplicate and duplicate.status == 'ready':
+        # Seen before: nothing left to process
+        asset.thumbnail_path = duplicate.thumbnail_path
+        apply_media_info(asset, info)
+        asset.variants = [variant.copy() for variant in duplicate.variants if variant.status == 'ready']
+        if asset.type == 'video':
+            # Renditions still being encoded for the other asset
+            queue_renditions(asset)
+    else:
+        # Thumbnail and metadata are filled in by a background job
+        job_queue.enqueue('process_asset', asset=asset)
+    return asset
 
 
 @assets_bp.route('', methods=['GET'])
 def get_assets():
-    """Get all assets with optional filtering."""
+    """Get assets with optional filtering, newest first.
+    
+    Pages are walked with ``cursor`` (the ``next_cursor`` of the previous
+    page), which stays fast however deep the page; ``page`` still works
+    for small libraries.
+    """
     asset_type = request.args.get('type')
     is_active = request.args.get('active')
+    cursor = request.args.get('cursor')
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 50, type=int)
+    per_page = max(1, min(request.args.get('per_page', 50, type=int), 500))
+    active = is_active.lower() == 'true' if is_active is not None else None
     
     query = Asset.query
     
     if asset_type:
         query = query.filter(Asset.type == asset_type)
-    if is_active is not None:
-        query = query.filter(Asset.is_active == (is_active.lower() == 'true'))
+    if active is not None:
+        query = query.filter(Asset.is_active == active)
     
-    query = query.order_by(Asset.created_at.desc())
+    if cursor:
+        try:
+            query = query.filter(after_cursor(Asset, cursor))
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    query = query.order_by(*newest_first(Asset))
+    if not cursor and page > 1:
+        query = query.offset((page - 1) * per_page)
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # One extra row tells whether there is a next page
+    assets = query.limit(per_page + 1).all()
+    has_more = len(assets) > per_page
+    assets = assets[:per_page]
+    total = asset_counts.get(asset_type or None, active)
     
     return jsonify({
-        'assets': [asset.to_dict() for asset in pagination.items],
-        'total': pagination.total,
-        'page': page,
+        'assets': [asset.to_dict() for asset in assets],
+        'total': total,
+        'page': None if cursor else page,
         'per_page': per_page,
-        'pages': pagination.pages
+        'pages': -(-total // per_page),
+        'next_cursor': encode_cursor(assets[-1]) if has_more else None
     })
 
 
+@assets_bp.route('/thumbnails/sprite', methods=['GET'])
+def get_thumbnail_sprite():
+    """Sprite sheet of many thumbnails in one image: ``?ids=1,2,3`` (up to 200).
+    
+    Returns the sheet URL, its grid size and each asset's tile index.
+    """
+    try:
+        asset_ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma-separated list of asset ids'}), 400
+    if not asset_ids:
+        return jsonify({'error': 'ids is required'}), 400
+    
+    # Repeated ids would only make another sheet with the same thumbnails
+    return jsonify(sprite_cache.get(list(dict.fromkeys(asset_ids))))
+
+
 @assets_bp.route('/<int:asset_id>', methods=['GET'])
 def get_asset(asset_id):
     """Get single asset by ID."""
     asset = Asset.query.get_or_404(asset_id)
-    return jsonify(asset.to_dict())
+    return jsonify(asset.to_dict(include_variants=True))
 
 
 @assets_bp.route('', methods=['POST'])
@@ -120,10 +185,7 @@ def create_asset():
         db.session.commit()
         
         # Log activity
-        log = ActivityLog(action='asset_created', entity_type='asset', 
-                         entity_id=asset.id, details=f"{asset_type.capitalize()} asset: {asset.name}")
-        db.session.add(log)
-        db.session.commit()
+        ActivityLog.log('asset_created', f"{asset_type.capitalize()} asset: {asset.name}", entity_type='asset', entity_id=asset.id)
         
         return jsonify(asset.to_dict()), 201
     
@@ -139,58 +201,179 @@ def create_asset():
     if not file_type:
         return jsonify({'error': 'File type not allowed'}), 400
     
-    # Generate unique filename
     original_name = secure_filename(file.filename)
-    ext = original_name.rsplit('.', 1)[1].lower() if '.' in original_name else ''
-    unique_filename = f"{uuid.uuid4().hex}.{ext}"
     
-    # Save file
+    # Save file, hashing, sizing and sniffing it while it streams to disk
     subfolder = 'images' if file_type == 'image' else 'videos'
-    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], subfolder, unique_filename)
-    file.save(filepath)
+    tmp_path, content_hash, file_size, mime_type = save_stream(file.stream, subfolder)
     
-    # Get file info
-    file_size = os.path.getsize(filepath)
-    width, height = None, None
-    
-    if file_type == 'image':
-        try:
-            with Image.open(filepath) as img:
-                width, height = img.size
-        except:
-            pass
-    
-    # Generate thumbnail
-    thumbnail_path = generate_thumbnail(filepath, file_type)
+    # Trust the content, not the file name or the client's Content-Type
+    file_type = sniffed_file_type(mime_type)
+    if not file_type:
+        discard(tmp_path)
+        return jsonify({'error': 'Unsupported or unrecognized file format'}), 400
     
     # Get custom name or use original
     name = request.form.get('name', original_name.rsplit('.', 1)[0])
     duration = request.form.get('duration', 10 if file_type == 'image' else 0, type=int)
     
-    asset = Asset(
-        name=name,
+    asset = build_file_asset(tmp_path, content_hash, file_size, mime_type, name, duration)
+    db.session.add(asset)
+    db.session.commit()
+    
+    # Log activity
+    ActivityLog.log('asset_created', f"File uploaded: {asset.name}", entity_type='asset', entity_id=asset.id)
+    
+    return jsonify(asset.to_dict()), 201
+
+
+def upload_part_path(upload):
+    return f"uploads/{upload.id}.part"
+
+
+@assets_bp.route('/uploads', methods=['POST'])
+def create_upload():
+    """Start a chunked, resumable upload.
+    
+    Body: {filename, size, name?, duration?, chunk_size?}. The file is then
+    sent with PUT /uploads/<id>/chunks/<index> and finished with
+    POST /uploads/<id>/complete.
+    """
+    data = request.get_json() or {}
+    filename = secure_filename(data.get('filename') or '')
+    total_size = data.get('size')
+    
+    if not filename:
+        return jsonify({'error': 'filename is required'}), 400
+    file_type = get_file_type(filename)
+    if not file_type:
+        return jsonify({'error': 'File type not allowed'}), 400
+    if not isinstance(total_size, int) or total_size <= 0:
+        return jsonify({'error': 'size must be a positive integer'}), 400
+    if total_size > current_app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({'error': 'File too large'}), 413
+    
+    duration = data.get('duration', 10 if file_type == 'image' else 0)
+    if 'duration' in data and (not isinstance(duration, int) or isinstance(duration, bool) or duration <= 0):
+        return jsonify({'error': 'duration must be a positive integer'}), 400
+    
+    chunk_size = data.get('chunk_size') or current_app.config['UPLOAD_CHUNK_SIZE']
+    if not isinstance(chunk_size, int) or not 0 < chunk_size <= current_app.config['UPLOAD_CHUNK_SIZE']:
+        return jsonify({'error': f"chunk_size must be between 1 and {current_app.config['UPLOAD_CHUNK_SIZE']}"}), 400
+    
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        filename=filename,
+        name=data.get('name') or filename.rsplit('.', 1)[0],
         type=file_type,
-        path=f"{subfolder}/{unique_filename}",
-        thumbnail_path=thumbnail_path,
         duration=duration,
-        mime_type=file.content_type,
-        file_size=file_size,
-        width=width,
-        height=height,
-        is_active=True
+        total_size=total_size,
+        chunk_size=chunk_size
     )
+    # Chunks are written in place, so the part file gets its final size now
+    preallocate(upload_part_path(upload), total_size)
+    db.session.add(upload)
+    db.session.commit()
+    
+    return jsonify(upload.to_dict()), 201
+
+
+@assets_bp.route('/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Upload progress: received bytes and the chunks still missing."""
+    upload = UploadSession.query.get_or_404(upload_id)
+    return jsonify(upload.to_dict())
+
+
+@assets_bp.route('/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def put_upload_chunk(upload_id, index):
+    """Write one chunk (raw request body) at its offset in the part file.
+    
+    Chunks may arrive in any order, in parallel, and may be re-sent.
+    """
+    upload = UploadSession.query.get_or_404(upload_id)
+    
+    if not 0 <= index < upload.chunk_count:
+        return jsonify({'error': f"Chunk index must be between 0 and {upload.chunk_count - 1}"}), 400
+    offset = index * upload.chunk_size
+    if request.args.get('offset', offset, type=int) != offset:
+        return jsonify({'error': f"Chunk {index} starts at offset {offset}"}), 400
+    length = upload.chunk_length(index)
+    if request.content_length is not None and request.content_length != length:
+        return jsonify({'error': f"Chunk {index} must be {length} bytes"}), 400
+    
+    written = write_at(upload_part_path(upload), offset, request.stream, length)
+    if written != length:
+        return jsonify({'error': f"Chunk {index} incomplete: got {written} of {length} bytes"}), 400
+    
+    # Only record the chunk once its bytes are on disk
+    db.session.execute(
+        insert(UploadChunk).values(upload_id=upload.id, index=index).on_conflict_do_nothing()
+    )
+    upload.updated_at = datetime.utcnow()
+    db.session.commit()
+    
+    return jsonify(upload.to_dict())
+
+
+@assets_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Turn a fully received upload into an asset."""
+    upload = UploadSession.query.get_or_404(upload_id)
+    
+    progress = upload.to_dict()
+    if not progress['complete']:
+        return jsonify({'error': 'Upload incomplete', 'missing_chunks': progress['missing_chunks']}), 409
+    
+    # A concurrent or repeated complete finds the part file gone
+    part_relpath = upload_part_path(upload)
+    part_path = claim_file(part_relpath)
+    if part_path is None:
+        return jsonify({'error': 'Upload already completed'}), 409
+    # If this request fails, the part file goes back so complete can be retried
+    after_rollback(lambda: release_file(part_path, part_relpath))
+    after_commit(lambda: discard(part_path))
+    
+    mime_type = sniff_file(part_path)
+    if not sniffed_file_type(mime_type):
+        db.session.delete(upload)
+        db.session.commit()
+        return jsonify({'error': 'Unsupported or unrecognized file format'}), 400
+    content_hash = hash_file(part_path)
+    
+    # The content store gets a link, the part file stays until the commit
+    asset = build_file_asset(link_copy(part_path), content_hash, upload.total_size, mime_type,
+                             upload.name, upload.duration)
     db.session.add(asset)
+    db.session.delete(upload)
     db.session.commit()
     
     # Log activity
-    log = ActivityLog(action='asset_created', entity_type='asset', 
-                     entity_id=asset.id, details=f"File uploaded: {asset.name}")
-    db.session.add(log)
-    db.session.commit()
+    ActivityLog.log('asset_created', f"File uploaded: {asset.name}", entity_type='asset', entity_id=asset.id)
     
     return jsonify(asset.to_dict()), 201
 
 
+@assets_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """Abandon an upload and remove its part file."""
+    upload = UploadSession.query.get_or_404(upload_id)
+    discard(media_path(upload_part_path(upload)))
+    db.session.delete(upload)
+    db.session.commit()
+    return jsonify({'message': 'Upload cancelled'})
+
+
+def expire_uploads():
+    """Drop upload sessions idle for longer than UPLOAD_SESSION_TTL seconds."""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL'])
+    stale = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+    for upload in stale:
+        discard(media_path(upload_part_path(upload)))
+        db.session.delete(upload)
+    db.session.commit()
+
+
 @assets_bp.route('/<int:asset_id>', methods=['PUT'])
 def update_asset(asset_id):
     """Update asset metadata."""
@@ -209,10 +392,7 @@ def update_asset(asset_id):
     db.session.commit()
     
     # Log activity
-    log = ActivityLog(action='asset_updated', entity_type='asset', 
-                     entity_id=asset.id, details=f"Updated: {asset.name}")
-    db.session.add(log)
-    db.session.commit()
+    ActivityLog.log('asset_updated', f"Updated: {asset.name}", entity_type='asset', entity_id=asset.id)
     
     SystemConfig.trigger_player_refresh()
     
@@ -224,54 +404,130 @@ def delete_asset(asset_id):
     """Delete asset and its file."""
     asset = Asset.query.get_or_404(asset_id)
     
-    # Delete physical file if exists
-    if asset.type != 'url' and asset.path:
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], asset.path)
-        if os.path.exists(filepath):
-            os.remove(filepath)
-    
-    # Delete thumbnail if exists
-    if asset.thumbnail_path:
-        thumb_path = os.path.join(current_app.config['UPLOAD_FOLDER'], asset.thumbnail_path)
-        if os.path.exists(thumb_path):
-            os.remove(thumb_path)
-    
     # Log before delete
-    log = ActivityLog(action='asset_deleted', entity_type='asset', 
-                     entity_id=asset.id, details=f"Deleted: {asset.name}")
-    db.session.add(log)
+    ActivityLog.log('asset_deleted', f"Deleted: {asset.name}", entity_type='asset', entity_id=asset.id)
     
+    # Files may be shared with identical assets; only drop unused ones
+    files = [asset.thumbnail_path]
+    if asset.type != 'url':
+        files.append(asset.path)
+        files.extend(variant.path for variant in asset.variants)
     db.session.delete(asset)
+    db.session.flush()
+    orphaned = unreferenced(files)
     db.session.commit()
     
+    # The delete is only final once the request commits
+    after_commit(lambda: remove_files(orphaned))
+    
     SystemConfig.trigger_player_refresh()
     
     return jsonify({'message': 'Asset deleted successfully'})
 
 
+def requested_resolution():
+    """(width, height) the file will be shown at, or None if unknown.
+    
+    From a ``?w=`` width hint (height None), else the registered resolution
+    of the screen named by ``?screen=``.
+    """
+    width = request.args.get('w', type=int)
+    if width and width > 0:
+        return width, None
+    screen_id = request.args.get('screen')
+    screen = screen_registry.get(screen_id) if screen_id else None
+    if screen and screen['resolution_width'] and screen['resolution_height']:
+        return screen['resolution_width'], screen['resolution_height']
+    return None
+
+
+def accepted_image_types():
+    """Modern image types the client lists explicitly in Accept (wildcards don't count)."""
+    return {mime_type for mime_type, quality in request.accept_mimetypes
+            if quality > 0 and mime_type in NEGOTIATED_IMAGE_TYPES}
+
+
+def pick_rendition(asset, resolution, accepted=()):
+    """Relative path and mime type of the file to send for an Asset or MediaEntry.
+    
+    The smallest rendition covering ``resolution`` wins, else the largest one;
+    between equal sizes AVIF beats WebP beats the rest, when ``accepted``. A
+    video original only competes when it is H.264, since video renditions
+    exist precisely because it may not play smoothly.
+    """
+    candidates = [(v.width or 0, v.height or 0, v.path, v.mime_type) for v in asset.variants
+                  if v.mime_type not in NEGOTIATED_IMAGE_TYPES or v.mime_type in accepted]
+    if resolution is None or not candidates:
+        return asset.path, asset.mime_type
+    if (asset.type == 'image' or asset.codec == 'h264') and asset.width and asset.height:
+        candidates.append((asset.width, asset.height, asset.path, asset.mime_type))
+    
+    width, height = resolution
+    if height is not None:
+        # Shown scaled to fit the screen, so only that width is needed
+        width = min(width, asset.width * height / asset.height) if asset.width and asset.height else width
+    covering = [c for c in candidates if c[0] + 1 >= width]
+    
+    def preference(candidate):
+        mime_type = candidate[3]
+        rank = NEGOTIATED_IMAGE_TYPES.index(mime_type) if mime_type in NEGOTIATED_IMAGE_TYPES else len(NEGOTIATED_IMAGE_TYPES)
+        return candidate[0] * candidate[1], rank
+    
+    if covering:
+        best = min(covering, key=preference)
+    else:
+        largest = max(c[0] * c[1] for c in candidates)
+        best = min((c for c in candidates if c[0] * c[1] == largest), key=preference)
+    return best[2], best[3]
+
+
 @assets_bp.route('/<int:asset_id>/file', methods=['GET'])
 def get_asset_file(asset_id):
-    """Serve asset file."""
-    asset = Asset.query.get_or_404(asset_id)
+    """Serve asset file, or the rendition best suited to ``?w=`` or ``?screen=<id>``.
     
-    if asset.type == 'url':
+    Resolved from the in-memory media index, so repeat fetches skip the
+    database; the ETag comes from the content hash.
+    """
+    entry = media_index.get(asset_id)
+    if entry is None:
+        return jsonify({'error': 'Asset not found'}), 404
+    
+    if entry.type == 'url':
         return jsonify({'error': 'URL assets cannot be served as files'}), 400
     
-    directory = os.path.dirname(os.path.join(current_app.config['UPLOAD_FOLDER'], asset.path))
-    filename = os.path.basename(asset.path)
+    path, mime_type = pick_rendition(entry, requested_resolution(), accepted_image_types())
+    etag = content_etag(path, entry.content_hash if path == entry.path else None)
+    
+    response = send_media(path, mime_type, etag)
+    if entry.type == 'image':
+        response.vary.add('Accept')
+    return response
+
+
+@assets_bp.route('/<int:asset_id>/transcode', methods=['POST'])
+def queue_transcode(asset_id):
+    """Queue the video renditions missing for the current profiles."""
+    asset = Asset.query.get_or_404(asset_id)
+    
+    if asset.type != 'video':
+        return jsonify({'error': 'Only videos can be transcoded'}), 400
+    
+    job = queue_renditions(asset)
+    if job is None:
+        return jsonify({'message': 'No renditions missing'})
+    db.session.commit()
     
-    return send_from_directory(directory, filename)
+    return jsonify(job.to_dict()), 202
 
 
 @assets_bp.route('/<int:asset_id>/thumbnail', methods=['GET'])
 def get_asset_thumbnail(asset_id):
     """Serve asset thumbnail."""
-    asset = Asset.query.get_or_404(asset_id)
+    entry = media_index.get(asset_id)
+    if entry is None:
+        return jsonify({'error': 'Asset not found'}), 404
     
-    if not asset.thumbnail_path:
+    if not entry.thumbnail_path:
         return jsonify({'error': 'No thumbnail available'}), 404
     
-    directory = os.path.dirname(os.path.join(current_app.config['UPLOAD_FOLDER'], asset.thumbnail_path))
-    filename = os.path.basename(asset.thumbnail_path)
-    
-    return send_from_directory(directory, filename)
+    return send_media(entry.thumbnail_path, 'image/jpeg', content_etag(entry.thumbnail_path))
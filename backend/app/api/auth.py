@@ -79,9 +79,11 @@ def login():
         session['authenticated'] = True
         session.permanent = True
         ActivityLog.log('auth_login', 'Connexion réussie')
+        db.session.commit()
         return jsonify({'success': True})
     
     ActivityLog.log('auth_failed', 'Tentative de connexion échouée')
+    db.session.commit()
     return jsonify({'error': 'Mot de passe incorrect'}), 401
 
 
@@ -132,8 +134,8 @@ def remove_password():
     config = SystemConfig.query.filter_by(key='admin_password').first()
     if config:
         db.session.delete(config)
-        db.session.commit()
     
     ActivityLog.log('password_removed', 'Protection par mot de passe désactivée')
+    db.session.commit()
     
     return jsonify({'success': True, 'message': 'Protection par mot de passe désactivée'})
@@ -0,0 +1,71 @@
+from flask import Blueprint, request, jsonify, current_app
+from app.unit_of_work import unit_of_work
+
+batch_bp = Blueprint('batch', __name__)
+
+# Endpoints that can take part in a batch (JSON requests only, no uploads)
+BATCH_PREFIXES = ('/api/playlists', '/api/assets', '/api/schedules')
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+MAX_OPERATIONS = 100
+
+
+class OperationFailed(Exception):
+    def __init__(self, index, response):
+        self.index = index
+        self.response = response
+
+
+@batch_bp.route('', methods=['POST'])
+def run_batch():
+    """Run several API calls in one transaction.
+
+    Body: ``{"operations": [{"method": "PUT", "path": "/api/playlists/1",
+    "body": {...}}, ...]}``. Operations run in order; if one fails (an
+    error status or an exception) none of them is applied. Screens are
+    refreshed once, by the same commit.
+    """
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations array is required'}), 400
+    if len(operations) > MAX_OPERATIONS:
+        return jsonify({'error': f'At most {MAX_OPERATIONS} operations per batch'}), 400
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict) or op.get('method', '').upper() not in BATCH_METHODS:
+            return jsonify({'error': f'Operation {index}: invalid method', 'index': index}), 400
+        path = op.get('path') or ''
+        if not any(path == prefix or path.startswith(prefix + '/') or path.startswith(prefix + '?')
+                   for prefix in BATCH_PREFIXES):
+            return jsonify({'error': f'Operation {index}: path not allowed in a batch', 'index': index}), 400
+
+    # The session cookie carries the login through to each operation
+    headers = {key: value for key, value in request.headers.items() if key in ('Cookie', 'Authorization')}
+    results = []
+    try:
+        with unit_of_work():
+            for index, op in enumerate(operations):
+                response = dispatch(op, headers)
+                result = {'status': response.status_code, 'body': response.get_json(silent=True)}
+                results.append(result)
+                if response.status_code >= 400:
+                    raise OperationFailed(index, result)
+    except OperationFailed as e:
+        return jsonify({
+            'error': f'Operation {e.index} failed, nothing was applied',
+            'index': e.index,
+            'result': e.response
+        }), e.response['status']
+
+    return jsonify({'results': results})
+
+
+def dispatch(op, headers):
+    """Response of one operation, handled like a request of its own."""
+    with current_app.test_request_context(op['path'], method=op['method'].upper(),
+                                          json=op.get('body'), headers=headers):
+        try:
+            return current_app.full_dispatch_request()
+        except Exception as e:
+            current_app.logger.exception('Batch operation failed')
+            return current_app.make_response((jsonify({'error': str(e)}), 500))
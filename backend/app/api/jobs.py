@@ -0,0 +1,32 @@
+from flask import Blueprint, request, jsonify
+from app.models import Job
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+@jobs_bp.route('', methods=['GET'])
+def get_jobs():
+    """List background jobs, newest first."""
+    limit = request.args.get('limit', 50, type=int)
+    status = request.args.get('status')
+    asset_id = request.args.get('asset_id', type=int)
+    
+    query = Job.query
+    
+    if status:
+        query = query.filter(Job.status == status)
+    if asset_id:
+        query = query.filter(Job.asset_id == asset_id)
+    
+    jobs = query.order_by(Job.id.desc()).limit(limit).all()
+    
+    return jsonify({
+        'jobs': [job.to_dict() for job in jobs]
+    })
+
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status of one job."""
+    job = Job.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
@@ -1,56 +1,40 @@
+import json
+from urllib.parse import urlencode
 from datetime import datetime
-from flask import Blueprint, request, jsonify, current_app, send_from_directory
-import os
+from flask import Blueprint, Response, request, jsonify, current_app
+from sqlalchemy.orm import contains_eager
 from app import db
-from app.models import Playlist, PlaylistAsset, Schedule, Asset
+from app.models import PlaylistAsset, Schedule, Asset
+from app.playback import resolve_content, content_etag, build_timeline
+from app.playlist_cache import playlist_cache
+from app.player_sync import player_sync
+from app.screen_registry import screen_registry
 
 player_bp = Blueprint('player', __name__)
 
+# Seconds between keep-alive comments on idle event streams
+EVENTS_HEARTBEAT = 15
+
+# Longest a /sync long-poll may be held open, in seconds
+SYNC_MAX_WAIT = 30
+
+# Longest horizon /timeline will resolve, in hours
+TIMELINE_MAX_HOURS = 168
+
+# Most items a /preload manifest may list, and how many get Link headers
+PRELOAD_MAX_COUNT = 50
+PRELOAD_LINK_COUNT = 3
+
 
 @player_bp.route('/current', methods=['GET'])
 def get_current_content():
-    """Get current playlist content to display based on schedule."""
+    """Get current playlist content to display based on schedule.
+
+    Served from the compiled schedule timeline and playlist cache; answers
+    ``If-None-Match`` with a bodiless 304 when the content is unchanged.
+    """
     now = datetime.now()
-    current_time = now.time()
-    current_day = now.weekday()
-    current_date = now.date()
-    
-    # Find active schedule
-    schedules = Schedule.query.filter(
-        Schedule.is_active == True
-    ).order_by(Schedule.priority.desc()).all()
-    
-    active_schedule = None
-    for schedule in schedules:
-        days = [int(d) for d in schedule.days_of_week.split(',') if d]
-        if current_day not in days:
-            continue
-        
-        if schedule.start_date and current_date < schedule.start_date:
-            continue
-        if schedule.end_date and current_date > schedule.end_date:
-            continue
-        
-        if schedule.start_time <= schedule.end_time:
-            if schedule.start_time <= current_time <= schedule.end_time:
-                active_schedule = schedule
-                break
-        else:
-            if current_time >= schedule.start_time or current_time <= schedule.end_time:
-                active_schedule = schedule
-                break
-    
-    # Get playlist
-    playlist = None
-    if active_schedule:
-        playlist = Playlist.query.get(active_schedule.playlist_id)
-    else:
-        # Fall back to default playlist
-        playlist = Playlist.query.filter_by(is_default=True, is_active=True).first()
-    
-    if not playlist:
-        # Get first active playlist
-        playlist = Playlist.query.filter_by(is_active=True).first()
+    playlist, active_schedule, items = resolve_content(now)
     
     if not playlist:
         return jsonify({
@@ -58,73 +42,45 @@ def get_current_content():
             'items': []
         })
     
-    # Get playlist assets
-    playlist_assets = PlaylistAsset.query.filter_by(playlist_id=playlist.id)\
-        .order_by(PlaylistAsset.position).all()
-    
-    items = []
-    for pa in playlist_assets:
-        if not pa.asset or not pa.asset.is_active:
-            continue
-        
-        # Check per-item schedule if defined
-        if pa.schedule_start_time or pa.schedule_end_time or pa.schedule_days or pa.schedule_start_date or pa.schedule_end_date:
-            # Check date range first
-            if pa.schedule_start_date and current_date < pa.schedule_start_date:
-                continue
-            if pa.schedule_end_date and current_date > pa.schedule_end_date:
-                continue
-            
-            # Check day of week
-            if pa.schedule_days:
-                allowed_days = [int(d) for d in pa.schedule_days.split(',') if d]
-                if current_day not in allowed_days:
-                    continue
-            
-            # Check time range
-            if pa.schedule_start_time and pa.schedule_end_time:
-                if pa.schedule_start_time <= pa.schedule_end_time:
-                    # Normal range (e.g., 09:00-18:00)
-                    if not (pa.schedule_start_time <= current_time <= pa.schedule_end_time):
-                        continue
-                else:
-                    # Overnight range (e.g., 22:00-06:00)
-                    if not (current_time >= pa.schedule_start_time or current_time <= pa.schedule_end_time):
-                        continue
-            elif pa.schedule_start_time:
-                if current_time < pa.schedule_start_time:
-                    continue
-            elif pa.schedule_end_time:
-                if current_time > pa.schedule_end_time:
-                    continue
-        
-        duration = pa.custom_duration if pa.custom_duration else pa.asset.duration
-        item = {
-            'id': pa.id,
-            'asset_id': pa.asset.id,
-            'type': pa.asset.type,
-            'name': pa.asset.name,
-            'path': pa.asset.path,
-            'duration': duration,
-            'position': pa.position
-        }
-        
-        # Add full URL for files
-        if pa.asset.type != 'url':
-            item['url'] = f"/api/assets/{pa.asset.id}/file"
-        else:
-            item['url'] = pa.asset.path
-        
-        items.append(item)
+    etag = content_etag(playlist, items, active_schedule)
+    
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        schedule = db.session.get(Schedule, active_schedule.id) if active_schedule else None
+        response = jsonify({
+            'playlist': {
+                'id': playlist.id,
+                'name': playlist.name
+            },
+            'schedule': schedule.to_dict() if schedule else None,
+            'items': items,
+            'timestamp': now.isoformat()
+        })
+    
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate on every poll
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
+
+@player_bp.route('/timeline', methods=['GET'])
+def get_timeline():
+    """Resolved content segments for the next ``hours`` hours (default 24).
+
+    Each segment carries the items to play and its content ETag; screens can
+    sleep until ``next_change`` instead of polling /current.
+    """
+    hours = min(max(request.args.get('hours', 24, type=int), 1), TIMELINE_MAX_HOURS)
+    now = datetime.now()
+    segments = build_timeline(now, hours)
     
     return jsonify({
-        'playlist': {
-            'id': playlist.id,
-            'name': playlist.name
-        },
-        'schedule': active_schedule.to_dict() if active_schedule else None,
-        'items': items,
+        'segments': [dict(segment,
+                          start=segment['start'].isoformat(),
+                          end=segment['end'].isoformat()) for segment in segments],
+        'next_change': segments[0]['end'].isoformat() if len(segments) > 1 else None,
+        'until': segments[-1]['end'].isoformat(),
         'timestamp': now.isoformat()
     })
 
@@ -138,16 +94,19 @@ def get_next_item():
     if not playlist_id:
         return jsonify({'error': 'playlist_id is required'}), 400
     
-    # Get next item
-    next_item = PlaylistAsset.query.filter(
+    # Only items whose per-item schedule allows them right now, filtered in SQL
+    visible = PlaylistAsset.query.join(Asset).filter(
         PlaylistAsset.playlist_id == playlist_id,
-        PlaylistAsset.position > current_position
-    ).order_by(PlaylistAsset.position).first()
+        Asset.is_active == True,
+        PlaylistAsset.visible_at(datetime.now())
+    ).options(contains_eager(PlaylistAsset.asset)).order_by(PlaylistAsset.position)
+    
+    # Get next item
+    next_item = visible.filter(PlaylistAsset.position > current_position).first()
     
     # If no next item, loop to first
     if not next_item:
-        next_item = PlaylistAsset.query.filter_by(playlist_id=playlist_id)\
-            .order_by(PlaylistAsset.position).first()
+        next_item = visible.first()
     
     if not next_item or not next_item.asset:
         return jsonify({'message': 'No next item'})
@@ -166,15 +125,151 @@ def get_next_item():
     })
 
 
+@player_bp.route('/preload', methods=['GET'])
+def get_preload_manifest():
+    """Next ``count`` visible items after position ``from``, for prefetching.
+    
+    Served from the compiled playlist cache with the same per-item schedule
+    filtering as /current; each item carries size, content hash and mime type.
+    """
+    playlist_id = request.args.get('playlist_id', type=int)
+    after_position = request.args.get('from', -1, type=int)
+    count = min(max(request.args.get('count', 5, type=int), 1), PRELOAD_MAX_COUNT)
+    
+    if not playlist_id:
+        return jsonify({'error': 'playlist_id is required'}), 400
+    
+    playlist = playlist_cache.get(playlist_id)
+    if not playlist:
+        return jsonify({'error': 'Playlist not found'}), 404
+    
+    items = playlist.upcoming_items(datetime.now(), after_position, count)
+    response = jsonify({
+        'playlist_id': playlist.id,
+        'items': items
+    })
+    
+    # Screens fetch files with ?screen=<id> to get their rendition; preload the same URLs
+    screen_id = request.args.get('screen')
+    suffix = f"?{urlencode({'screen': screen_id})}" if screen_id else ''
+    links = []
+    for item in items:
+        if item['type'] in ('image', 'video') and len(links) < PRELOAD_LINK_COUNT:
+            links.append(f"<{item['url']}{suffix}>; rel=preload; as={item['type']}")
+    if links:
+        response.headers['Link'] = ', '.join(links)
+    return response
+
+
+def parse_resolution(value):
+    """(width, height) from {"width": w, "height": h} or "WxH", else (None, None)."""
+    try:
+        if isinstance(value, dict):
+            return int(value['width']), int(value['height'])
+        if isinstance(value, str) and 'x' in value:
+            width, height = value.lower().split('x', 1)
+            return int(width), int(height)
+    except (KeyError, TypeError, ValueError):
+        pass
+    return None, None
+
+
+def parse_id(value):
+    """An integer id from a heartbeat field, or None."""
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
 @player_bp.route('/status', methods=['POST'])
 def update_player_status():
-    """Update player status (for monitoring)."""
-    data = request.get_json() or {}
+    """Record a player heartbeat in the screen registry (for monitoring).
+    
+    Only memory is touched here; the registry writes to the database in
+    batches on an interval.
+    """
+    data = request.get_json(silent=True) or {}
+    screen_id = str(data.get('screen_id') or request.remote_addr)[:64]
+    
+    current_item = data.get('current_item')
+    if not isinstance(current_item, dict):
+        current_item = {}
+    width, height = parse_resolution(data.get('resolution'))
+    values = {
+        'playlist_id': parse_id(data.get('playlist_id')),
+        'current_item_id': parse_id(current_item.get('id')),
+        'current_asset_id': parse_id(current_item.get('asset_id')),
+        'software_version': str(data['version'])[:50] if data.get('version') else None,
+        'ip_address': request.remote_addr
+    }
+    if width:
+        values.update(resolution_width=width, resolution_height=height)
+    screen_registry.heartbeat(screen_id, values)
     
-    # This could be extended to store player status in DB
-    # For now, just acknowledge
     return jsonify({
         'message': 'Status received',
+        'screen_id': screen_id,
         'received': data,
         'timestamp': datetime.now().isoformat()
     })
+
+
+@player_bp.route('/screens', methods=['GET'])
+def get_screens():
+    """Fleet status from the in-memory screen registry."""
+    screens = screen_registry.fleet(current_app.config['SCREEN_OFFLINE_AFTER'])
+    return jsonify({
+        'screens': screens,
+        'total': len(screens),
+        'online': sum(1 for s in screens if s['online'])
+    })
+
+
+@player_bp.route('/sync', methods=['GET'])
+def get_sync_state():
+    """Refresh token and pending command, from the in-memory snapshot.
+
+    ``since`` is the last version the screen saw; ``wait`` (seconds) turns the
+    call into a long-poll that returns as soon as the version moves on.
+    """
+    since = request.args.get('since', type=int)
+    wait = min(max(request.args.get('wait', 0, type=int), 0), SYNC_MAX_WAIT)
+    
+    state = player_sync.snapshot()
+    if wait and state['version'] == since:
+        state = player_sync.wait(since, wait)
+    
+    state['changed'] = state['version'] != since
+    return jsonify(state)
+
+
+@player_bp.route('/events', methods=['GET'])
+def stream_events():
+    """Server-Sent Events stream of refresh tokens and remote commands.
+
+    Sends the current state on connect (unless ``Last-Event-ID`` is already
+    current), then one ``sync`` event per change. Idle connections just wait
+    on a condition, so under the evented server they cost no worker thread.
+    """
+    last_version = request.headers.get('Last-Event-ID', type=int)
+    # Load the snapshot while the app context is still active
+    player_sync.snapshot()
+    
+    def generate():
+        version = last_version
+        yield "retry: 3000\n\n"
+        while True:
+            state = player_sync.wait(version, EVENTS_HEARTBEAT)
+            if state['version'] == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = state['version']
+            yield f"id: {version}\nevent: sync\ndata: {json.dumps(state)}\n\n"
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
+from sqlalchemy import case
+from sqlalchemy.orm import joinedload
 from app import db
-from app.models import Playlist, PlaylistAsset, Asset, ActivityLog, SystemConfig
+from app.models import Playlist, PlaylistAsset, Asset, ActivityLog, SystemConfig, playlists_to_dicts, POSITION_GAP
 
 playlists_bp = Blueprint('playlists', __name__)
 
@@ -11,7 +13,7 @@ def get_playlists():
     include_assets = request.args.get('include_assets', 'false').lower() == 'true'
     playlists = Playlist.query.order_by(Playlist.created_at.desc()).all()
     return jsonify({
-        'playlists': [p.to_dict(include_assets=include_assets) for p in playlists]
+        'playlists': playlists_to_dicts(playlists, include_assets=include_assets)
     })
 
 
@@ -45,10 +47,7 @@ def create_playlist():
     db.session.commit()
     
     # Log activity
-    log = ActivityLog(action='playlist_created', entity_type='playlist', 
-                     entity_id=playlist.id, details=f"Created: {playlist.name}")
-    db.session.add(log)
-    db.session.commit()
+    ActivityLog.log('playlist_created', f"Created: {playlist.name}", entity_type='playlist', entity_id=playlist.id)
     
     return jsonify(playlist.to_dict()), 201
 
@@ -73,10 +72,7 @@ def update_playlist(playlist_id):
     db.session.commit()
     
     # Log activity
-    log = ActivityLog(action='playlist_updated', entity_type='playlist', 
-                     entity_id=playlist.id, details=f"Updated: {playlist.name}")
-    db.session.add(log)
-    db.session.commit()
+    ActivityLog.log('playlist_updated', f"Updated: {playlist.name}", entity_type='playlist', entity_id=playlist.id)
     
     return jsonify(playlist.to_dict())
 
@@ -87,9 +83,7 @@ def delete_playlist(playlist_id):
     playlist = Playlist.query.get_or_404(playlist_id)
     
     # Log before delete
-    log = ActivityLog(action='playlist_deleted', entity_type='playlist', 
-                     entity_id=playlist.id, details=f"Deleted: {playlist.name}")
-    db.session.add(log)
+    ActivityLog.log('playlist_deleted', f"Deleted: {playlist.name}", entity_type='playlist', entity_id=playlist.id)
     
     db.session.delete(playlist)
     db.session.commit()
@@ -102,6 +96,7 @@ def get_playlist_assets(playlist_id):
     """Get assets in playlist with order."""
     playlist = Playlist.query.get_or_404(playlist_id)
     playlist_assets = PlaylistAsset.query.filter_by(playlist_id=playlist_id)\
+        .options(joinedload(PlaylistAsset.asset))\
         .order_by(PlaylistAsset.position).all()
     
     return jsonify({
@@ -129,7 +124,7 @@ def add_asset_to_playlist(playlist_id):
     
     # Get the next position
     max_position = db.session.query(db.func.max(PlaylistAsset.position))\
-        .filter(PlaylistAsset.playlist_id == playlist_id).scalar() or -1
+        .filter(PlaylistAsset.playlist_id == playlist_id).scalar() or 0
     
     added_assets = []
     for i, asset_id in enumerate(asset_ids):
@@ -140,7 +135,7 @@ def add_asset_to_playlist(playlist_id):
         playlist_asset = PlaylistAsset(
             playlist_id=playlist_id,
             asset_id=asset.id,
-            position=max_position + 1 + i,
+            position=max_position + POSITION_GAP * (i + 1),
             custom_duration=data.get('custom_duration')
         )
         db.session.add(playlist_asset)
@@ -166,15 +161,8 @@ def remove_asset_from_playlist(playlist_id, playlist_asset_id):
         id=playlist_asset_id, playlist_id=playlist_id
     ).first_or_404()
     
-    removed_position = playlist_asset.position
+    # Positions are sparse: the others keep theirs
     db.session.delete(playlist_asset)
-    
-    # Reorder remaining items
-    PlaylistAsset.query.filter(
-        PlaylistAsset.playlist_id == playlist_id,
-        PlaylistAsset.position > removed_position
-    ).update({PlaylistAsset.position: PlaylistAsset.position - 1})
-    
     db.session.commit()
     
     SystemConfig.trigger_player_refresh()
@@ -191,25 +179,87 @@ def reorder_playlist_assets(playlist_id):
     if not data or 'order' not in data:
         return jsonify({'error': 'order array is required'}), 400
     
-    # order is an array of playlist_asset_ids in new order
-    for index, playlist_asset_id in enumerate(data['order']):
-        PlaylistAsset.query.filter_by(
-            id=playlist_asset_id, playlist_id=playlist_id
-        ).update({'position': index})
+    # order is an array of playlist_asset_ids in new order; items left out
+    # keep their relative order after the listed ones
+    current = [pa_id for (pa_id,) in PlaylistAsset.query.with_entities(PlaylistAsset.id)
+               .filter_by(playlist_id=playlist_id).order_by(PlaylistAsset.position)]
+    known = set(current)
+    order = list(dict.fromkeys(pa_id for pa_id in data['order'] if pa_id in known))
+    listed = set(order)
+    renumber(playlist_id, order + [pa_id for pa_id in current if pa_id not in listed])
     
     db.session.commit()
     
     # Log activity
-    log = ActivityLog(action='playlist_reordered', entity_type='playlist', 
-                     entity_id=playlist_id, details=f"Assets reordered")
-    db.session.add(log)
-    db.session.commit()
+    ActivityLog.log('playlist_reordered', f"Assets reordered", entity_type='playlist', entity_id=playlist_id)
     
     SystemConfig.trigger_player_refresh()
     
     return jsonify({'message': 'Playlist reordered successfully'})
 
 
+@playlists_bp.route('/<int:playlist_id>/assets/<int:playlist_asset_id>/move', methods=['PUT'])
+def move_playlist_asset(playlist_id, playlist_asset_id):
+    """Move one item right after ``after_id`` (or first when it is null).
+    
+    Takes the position halfway to the next item, so only this row changes;
+    the playlist is renumbered when there is no gap left.
+    """
+    playlist_asset = PlaylistAsset.query.filter_by(
+        id=playlist_asset_id, playlist_id=playlist_id
+    ).first_or_404()
+    data = request.get_json() or {}
+    after_id = data.get('after_id')
+    
+    if after_id == playlist_asset.id:
+        return jsonify({'error': 'Cannot move an item after itself'}), 400
+    
+    position = free_position(playlist_id, playlist_asset.id, after_id)
+    if position is None:
+        return jsonify({'error': 'after_id is not in this playlist'}), 404
+    playlist_asset.position = position
+    
+    ActivityLog.log('playlist_reordered', f"Asset moved", entity_type='playlist', entity_id=playlist_id)
+    db.session.commit()
+    
+    SystemConfig.trigger_player_refresh()
+    
+    return jsonify(playlist_asset.to_dict())
+
+
+def free_position(playlist_id, moved_id, after_id):
+    """Unused position right after item ``after_id`` (first if None), or None if not found."""
+    items = PlaylistAsset.query.with_entities(PlaylistAsset.id, PlaylistAsset.position)\
+        .filter(PlaylistAsset.playlist_id == playlist_id, PlaylistAsset.id != moved_id)
+    if after_id is None:
+        low = 0
+    else:
+        low = items.filter(PlaylistAsset.id == after_id).with_entities(PlaylistAsset.position).scalar()
+        if low is None:
+            return None
+    following = items.filter(PlaylistAsset.position > low).order_by(PlaylistAsset.position).first()
+    if following is None:
+        return low + POSITION_GAP
+    if following.position - low > 1:
+        return (low + following.position) // 2
+    
+    # No room left between the two: spread the playlist out again, then retry
+    order = [pa_id for (pa_id,) in items.with_entities(PlaylistAsset.id).order_by(PlaylistAsset.position)]
+    renumber(playlist_id, order)
+    return free_position(playlist_id, moved_id, after_id)
+
+
+def renumber(playlist_id, order):
+    """Give the items of ``order`` (playlist_asset ids) evenly spaced positions in one UPDATE."""
+    if not order:
+        return
+    positions = {pa_id: POSITION_GAP * (index + 1) for index, pa_id in enumerate(order)}
+    PlaylistAsset.query.filter(
+        PlaylistAsset.playlist_id == playlist_id,
+        PlaylistAsset.id.in_(positions)
+    ).update({'position': case(positions, value=PlaylistAsset.id)}, synchronize_session=False)
+
+
 @playlists_bp.route('/<int:playlist_id>/assets/<int:playlist_asset_id>', methods=['PUT'])
 def update_playlist_asset(playlist_id, playlist_asset_id):
     """Update playlist asset (custom duration, schedule)."""
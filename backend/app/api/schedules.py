@@ -2,6 +2,7 @@ from datetime import datetime, time
 from flask import Blueprint, request, jsonify
 from app import db
 from app.models import Schedule, Playlist, ActivityLog
+from app.schedule_engine import schedule_engine
 
 schedules_bp = Blueprint('schedules', __name__)
 
@@ -75,10 +76,7 @@ def create_schedule():
     db.session.commit()
     
     # Log activity
-    log = ActivityLog(action='schedule_created', entity_type='schedule', 
-                     entity_id=schedule.id, details=f"Created: {schedule.name}")
-    db.session.add(log)
-    db.session.commit()
+    ActivityLog.log('schedule_created', f"Created: {schedule.name}", entity_type='schedule', entity_id=schedule.id)
     
     return jsonify(schedule.to_dict()), 201
 
@@ -117,10 +115,7 @@ def update_schedule(schedule_id):
     db.session.commit()
     
     # Log activity
-    log = ActivityLog(action='schedule_updated', entity_type='schedule', 
-                     entity_id=schedule.id, details=f"Updated: {schedule.name}")
-    db.session.add(log)
-    db.session.commit()
+    ActivityLog.log('schedule_updated', f"Updated: {schedule.name}", entity_type='schedule', entity_id=schedule.id)
     
     return jsonify(schedule.to_dict())
 
@@ -131,9 +126,7 @@ def delete_schedule(schedule_id):
     schedule = Schedule.query.get_or_404(schedule_id)
     
     # Log before delete
-    log = ActivityLog(action='schedule_deleted', entity_type='schedule', 
-                     entity_id=schedule.id, details=f"Deleted: {schedule.name}")
-    db.session.add(log)
+    ActivityLog.log('schedule_deleted', f"Deleted: {schedule.name}", entity_type='schedule', entity_id=schedule.id)
     
     db.session.delete(schedule)
     db.session.commit()
@@ -144,37 +137,9 @@ def delete_schedule(schedule_id):
 @schedules_bp.route('/active', methods=['GET'])
 def get_active_schedule():
     """Get currently active schedule based on current time."""
-    now = datetime.now()
-    current_time = now.time()
-    current_day = now.weekday()  # 0=Monday, 6=Sunday
-    current_date = now.date()
-    
-    # Query active schedules
-    schedules = Schedule.query.filter(
-        Schedule.is_active == True
-    ).order_by(Schedule.priority.desc()).all()
-    
-    for schedule in schedules:
-        # Check day of week
-        days = [int(d) for d in schedule.days_of_week.split(',') if d]
-        if current_day not in days:
-            continue
-        
-        # Check date range if specified
-        if schedule.start_date and current_date < schedule.start_date:
-            continue
-        if schedule.end_date and current_date > schedule.end_date:
-            continue
-        
-        # Check time range
-        if schedule.start_time <= schedule.end_time:
-            # Normal range (e.g., 09:00 - 17:00)
-            if schedule.start_time <= current_time <= schedule.end_time:
-                return jsonify(schedule.to_dict())
-        else:
-            # Overnight range (e.g., 22:00 - 06:00)
-            if current_time >= schedule.start_time or current_time <= schedule.end_time:
-                return jsonify(schedule.to_dict())
+    schedule = schedule_engine.active_schedule(datetime.now())
+    if schedule:
+        return jsonify(schedule.to_dict())
     
     # No active schedule, return default playlist if any
     default_playlist = Playlist.query.filter_by(is_default=True, is_active=True).first()
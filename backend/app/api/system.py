@@ -5,10 +5,11 @@ import psutil
 import subprocess
 import threading
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify
-from app import db
-from app.models import SystemConfig, ActivityLog, Asset, Playlist
+from app import background, db
+from app.models import SystemConfig, ActivityLog, ActivityLogDaily, Asset, Playlist
+from app.pagination import after_cursor, newest_first, encode_cursor
 
 system_bp = Blueprint('system', __name__)
 
@@ -210,19 +211,52 @@ def get_system_info():
 
 @system_bp.route('/logs', methods=['GET'])
 def get_activity_logs():
-    """Get recent activity logs."""
-    limit = request.args.get('limit', 50, type=int)
+    """Get recent activity logs, newest first.
+    
+    Older entries are paged with ``cursor`` (the ``next_cursor`` of the
+    previous page).
+    """
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
     entity_type = request.args.get('type')
+    cursor = request.args.get('cursor')
     
     query = ActivityLog.query
     
     if entity_type:
         query = query.filter(ActivityLog.entity_type == entity_type)
+    if cursor:
+        try:
+            query = query.filter(after_cursor(ActivityLog, cursor))
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    # One extra row tells whether there is a next page
+    logs = query.order_by(*newest_first(ActivityLog)).limit(limit + 1).all()
+    has_more = len(logs) > limit
+    logs = logs[:limit]
+    
+    return jsonify({
+        'logs': [log.to_dict() for log in logs],
+        'next_cursor': encode_cursor(logs[-1]) if has_more else None
+    })
+
+
+@system_bp.route('/logs/daily', methods=['GET'])
+def get_activity_rollup():
+    """Activity counts per day and action over the last ``days`` days (default 30)."""
+    days = max(1, min(request.args.get('days', 30, type=int), 730))
+    action = request.args.get('action')
     
-    logs = query.order_by(ActivityLog.created_at.desc()).limit(limit).all()
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    query = ActivityLogDaily.query.filter(ActivityLogDaily.day >= since)
+    if action:
+        query = query.filter(ActivityLogDaily.action == action)
+    rows = query.order_by(ActivityLogDaily.day, ActivityLogDaily.action).all()
     
     return jsonify({
-        'logs': [log.to_dict() for log in logs]
+        'since': since.isoformat(),
+        'days': [row.to_dict() for row in rows],
+        'total': sum(row.count for row in rows)
     })
 
 
@@ -256,10 +290,7 @@ def update_config():
     db.session.commit()
     
     # Log activity
-    log = ActivityLog(action='config_updated', entity_type='system', 
-                     details=f"Updated config: {', '.join(updated)}")
-    db.session.add(log)
-    db.session.commit()
+    ActivityLog.log('config_updated', f"Updated config: {', '.join(updated)}", entity_type='system')
     
     return jsonify({'message': 'Configuration updated', 'updated_keys': updated})
 
@@ -303,12 +334,13 @@ def trigger_system_update():
             
         def delayed_restart():
             time.sleep(2)
+            # os._exit skips atexit: save buffered heartbeats and log entries first
+            background.shutdown()
             os._exit(0) # Lets systemd restart it
 
         threading.Thread(target=delayed_restart).start()
 
-        log = ActivityLog(action='system_update', entity_type='system', details="Started OTA update")
-        db.session.add(log)
+        ActivityLog.log('system_update', "Started OTA update", entity_type='system')
         db.session.commit()
 
         return jsonify({'message': 'Mise à jour réussie. Redémarrage du service...'})
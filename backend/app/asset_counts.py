@@ -0,0 +1,85 @@
+"""Cached asset totals per type and active flag.
+
+The asset listing reports a total for its filter; counting the table on
+every page gets slow on large libraries. Totals are loaded once with a
+single GROUP BY and then kept up to date from committed inserts, deletes
+and type/is_active changes.
+"""
+import threading
+
+from sqlalchemy import func, inspect
+
+from app import db
+from app.invalidation import on_commit
+from app.models import Asset
+
+
+class AssetCounts:
+    """Process-wide asset counts keyed by (type, is_active)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = None
+        self._generation = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._counts = None
+
+    def apply(self, changes):
+        """Adjust loaded counts by ``(old_key, new_key)`` pairs (None when absent)."""
+        with self._lock:
+            self._generation += 1
+            if self._counts is None:
+                return
+            for old_key, new_key in changes:
+                if old_key is not None:
+                    self._counts[old_key] = self._counts.get(old_key, 0) - 1
+                if new_key is not None:
+                    self._counts[new_key] = self._counts.get(new_key, 0) + 1
+
+    def get(self, asset_type=None, is_active=None):
+        """Number of assets matching the filters (None matches anything)."""
+        counts = self._counts
+        if counts is None:
+            generation = self._generation
+            rows = db.session.query(Asset.type, Asset.is_active, func.count(Asset.id))\
+                .group_by(Asset.type, Asset.is_active).all()
+            counts = {(t, bool(a)): n for t, a, n in rows}
+            with self._lock:
+                # A commit may have landed while counting; don't keep stale data.
+                if generation == self._generation:
+                    self._counts = counts
+        return sum(n for (t, a), n in counts.items()
+                   if (asset_type is None or t == asset_type) and (is_active is None or a == is_active))
+
+
+asset_counts = AssetCounts()
+
+
+def _count_keys(asset):
+    """(key before, key after) of an asset about to be flushed."""
+    state = inspect(asset)
+    key = (asset.type, bool(asset.is_active))
+    if state.pending:
+        # Column default not applied yet
+        return None, (asset.type, asset.is_active is not False)
+    if state.deleted or asset in state.session.deleted:
+        return key, None
+    type_history = state.attrs.type.history
+    active_history = state.attrs.is_active.history
+    old_key = (
+        type_history.deleted[0] if type_history.deleted else asset.type,
+        bool(active_history.deleted[0] if active_history.deleted else asset.is_active)
+    )
+    return old_key, key
+
+
+@on_commit(Asset, snapshot=_count_keys)
+def _update_counts(changes):
+    if any(keys is None for _, _, keys in changes):
+        # Bulk query update/delete: nothing to go on, count again
+        asset_counts.invalidate()
+        return
+    asset_counts.apply([keys for _, _, keys in changes if keys[0] != keys[1]])
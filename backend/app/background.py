@@ -0,0 +1,78 @@
+"""Periodic in-process maintenance tasks (APScheduler), and CPU-bound work
+kept off the gevent loop."""
+import atexit
+import contextvars
+import signal
+import threading
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+scheduler = BackgroundScheduler(daemon=True)
+
+_shutdown_hooks = []
+
+
+def every(app, seconds, func, job_id):
+    """Run ``func()`` inside an app context every ``seconds`` seconds."""
+    def run():
+        with app.app_context():
+            func()
+    scheduler.add_job(run, 'interval', seconds=seconds, id=job_id,
+                      replace_existing=True, coalesce=True, max_instances=1)
+
+
+def on_shutdown(app, func):
+    """Run ``func()`` inside an app context when the process exits."""
+    def run():
+        with app.app_context():
+            func()
+    _shutdown_hooks.append(run)
+
+
+def in_os_thread(func, *args):
+    """Call ``func(*args)`` in a real OS thread and return its result.
+
+    Under gevent every thread is a greenlet on one OS thread, and Pillow or
+    SQLite never yield: an image decode would stall every request and event
+    stream. The caller's greenlet waits on gevent's native thread pool while
+    the others keep running; the app context comes along. Without gevent
+    this is a plain call.
+    """
+    try:
+        import gevent
+        from gevent import monkey
+    except ImportError:
+        return func(*args)
+    if not monkey.is_module_patched('threading'):
+        return func(*args)
+    context = contextvars.copy_context()
+    return gevent.get_hub().threadpool.apply(context.run, (func,) + args)
+
+
+def start():
+    if not scheduler.running:
+        scheduler.start()
+        # systemd stops the service with SIGTERM, which skips atexit
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, _terminate)
+
+
+def _terminate(signum, frame):
+    # A normal exit, so the atexit hooks below run
+    raise SystemExit(0)
+
+
+@atexit.register
+def shutdown():
+    """Stop the scheduler and run the shutdown hooks (once, however the process ends).
+
+    Call it before os._exit(), which skips atexit.
+    """
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    while _shutdown_hooks:
+        hook = _shutdown_hooks.pop(0)
+        try:
+            hook()
+        except Exception as e:
+            print(f"Error during shutdown: {e}")
@@ -0,0 +1,69 @@
+"""Commit hooks used to keep in-memory caches in step with the database."""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_watchers = []
+
+
+def on_commit(*models, snapshot=None):
+    """Decorator: call ``fn(changes)`` after a commit that touched ``models``.
+
+    ``changes`` is a list of ``(operation, model_class, value)`` tuples where
+    operation is 'insert', 'update' or 'delete' and value is
+    ``snapshot(instance)`` taken before the flush (None without a snapshot
+    function, and for bulk ``Query.update()``/``delete()`` calls).
+    Changes that are rolled back are discarded.
+    """
+    def decorator(fn):
+        _watchers.append((models, snapshot, fn))
+        return fn
+    return decorator
+
+
+def _pending(session):
+    return session.info.setdefault('pending_changes', [])
+
+
+def _record(session, operation, obj=None, model=None):
+    model = model or type(obj)
+    for index, (models, snapshot, fn) in enumerate(_watchers):
+        if issubclass(model, models):
+            value = snapshot(obj) if snapshot and obj is not None else None
+            _pending(session).append((index, operation, model, value))
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changes(session, flush_context, instances):
+    for obj in session.new:
+        _record(session, 'insert', obj)
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            _record(session, 'update', obj)
+    for obj in session.deleted:
+        _record(session, 'delete', obj)
+
+
+@event.listens_for(Session, 'after_bulk_update')
+def _collect_bulk_update(update_context):
+    _record(update_context.session, 'update', model=update_context.mapper.class_)
+
+
+@event.listens_for(Session, 'after_bulk_delete')
+def _collect_bulk_delete(delete_context):
+    _record(delete_context.session, 'delete', model=delete_context.mapper.class_)
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_changes(session):
+    pending = session.info.pop('pending_changes', None)
+    if not pending:
+        return
+    for index, (models, snapshot, fn) in enumerate(_watchers):
+        changes = [(op, model, value) for i, op, model, value in pending if i == index]
+        if changes:
+            fn(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('pending_changes', None)
@@ -0,0 +1,196 @@
+"""Persistent background job queue with a bounded worker pool.
+
+Jobs are rows in the jobs table, added to the session with enqueue() and
+committed together with whatever created them. A dispatcher thread hands
+pending jobs to at most JOB_WORKERS workers; it wakes up after every commit
+that adds a job and otherwise polls every JOB_POLL_INTERVAL seconds. Jobs
+interrupted by a restart are picked up again on the next start. A failed
+job is retried after JOB_RETRY_DELAY seconds, doubled at each attempt.
+
+While an asset has jobs outstanding its status is 'processing'; it becomes
+'ready' (or 'failed') once the last one finishes. Handlers registered with
+holds_asset=False (e.g. transcodes) don't count.
+"""
+import json
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, or_
+
+from app import db
+from app.invalidation import on_commit
+from app.models import Asset, Job
+
+OUTSTANDING = ('pending', 'running')
+
+
+class JobQueue:
+    """Dispatches pending jobs to registered handlers."""
+
+    def __init__(self):
+        self._handlers = {}
+        self._limits = {}
+        self.detached_kinds = set()
+        self._lock = threading.Lock()
+        self._in_flight = {}  # job id -> kind
+        self._wakeup = threading.Event()
+        self._executor = None
+        self._app = None
+
+    def handler(self, kind, limit=None, holds_asset=True):
+        """Decorator registering ``fn(job)`` for jobs of ``kind``.
+
+        ``limit`` caps how many jobs of this kind run at once (the pool size
+        caps all of them together). Jobs with ``holds_asset=False`` leave
+        their asset's status alone: it stays usable while they run.
+        """
+        def decorator(fn):
+            self._handlers[kind] = fn
+            if limit:
+                self._limits[kind] = limit
+            if not holds_asset:
+                self.detached_kinds.add(kind)
+            return fn
+        return decorator
+
+    def enqueue(self, kind, asset=None, **payload):
+        """Add a job to the session; it runs once the session commits."""
+        job = Job(kind=kind, asset=asset, payload=json.dumps(payload) if payload else None)
+        if asset is not None and kind not in self.detached_kinds:
+            asset.status = 'processing'
+        db.session.add(job)
+        return job
+
+    def wake(self):
+        self._wakeup.set()
+
+    def start(self, app):
+        """Requeue jobs interrupted by a restart and start dispatching."""
+        if self._executor is not None:
+            return
+        self._app = app
+        with app.app_context():
+            Job.query.filter(Job.status == 'running').update({'status': 'pending'})
+            db.session.commit()
+        self._executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'],
+                                            thread_name_prefix='job')
+        self.wake()
+        threading.Thread(target=self._dispatch_loop, name='job-dispatcher', daemon=True).start()
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _dispatch_loop(self):
+        while True:
+            self._wakeup.wait(self._app.config['JOB_POLL_INTERVAL'])
+            self._wakeup.clear()
+            try:
+                with self._app.app_context():
+                    self._dispatch()
+            except Exception as e:
+                print(f"Error dispatching jobs: {e}")
+
+    def _dispatch(self):
+        pending = Job.query.with_entities(Job.id, Job.kind)\
+            .filter(Job.status == 'pending', due())\
+            .order_by(Job.id).limit(100).all()
+        with self._lock:
+            for job_id, kind in pending:
+                if job_id in self._in_flight:
+                    continue
+                limit = self._limits.get(kind)
+                if limit and sum(1 for k in self._in_flight.values() if k == kind) >= limit:
+                    continue
+                self._in_flight[job_id] = kind
+                self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        retry = False
+        try:
+            with self._app.app_context():
+                retry = self._execute(job_id)
+        finally:
+            with self._lock:
+                self._in_flight.pop(job_id, None)
+            # A slot is free: start whatever was held back (a job put back
+            # for a retry waits for a later poll anyway)
+            if not retry:
+                self.wake()
+
+    def _execute(self, job_id):
+        """Run one job; True if it failed and was put back for a retry."""
+        # Claim the job; another process may have taken it already
+        claimed = Job.query.filter(Job.id == job_id, Job.status == 'pending', due()).update({
+            'status': 'running',
+            'attempts': Job.attempts + 1,
+            'started_at': datetime.utcnow()
+        })
+        db.session.commit()
+        if not claimed:
+            return False
+
+        job = db.session.get(Job, job_id)
+        try:
+            self._handlers[job.kind](job)
+            job.status = 'done'
+            job.error = None
+        except Exception:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            if job is None:
+                return False
+            job.error = traceback.format_exc(limit=5)
+            # Retried later, with a growing delay, until JOB_MAX_ATTEMPTS is reached
+            if job.attempts >= self._app.config['JOB_MAX_ATTEMPTS']:
+                job.status = 'failed'
+            else:
+                job.status = 'pending'
+                delay = self._app.config['JOB_RETRY_DELAY'] * 2 ** (job.attempts - 1)
+                job.not_before = datetime.utcnow() + timedelta(seconds=delay)
+            print(f"Job {job.id} ({job.kind}) failed: {job.error}")
+        job.finished_at = datetime.utcnow()
+        db.session.flush()
+        if job.asset_id:
+            update_asset_status(job.asset_id)
+        db.session.commit()
+        return job.status == 'pending'
+
+    def prune(self):
+        """Delete finished jobs older than JOB_RETENTION days."""
+        cutoff = datetime.utcnow() - timedelta(days=self._app.config['JOB_RETENTION'])
+        Job.query.filter(Job.status == 'done', Job.finished_at < cutoff).delete()
+        db.session.commit()
+
+
+def due():
+    """Condition on jobs whose retry delay, if any, has passed."""
+    return or_(Job.not_before.is_(None), Job.not_before <= datetime.utcnow())
+
+
+def update_asset_status(asset_id):
+    """Mark an asset ready, or failed if its last job failed, once none of
+    its jobs are outstanding.
+
+    A single UPDATE, so two jobs of the same asset finishing together
+    cannot both miss the other's completion.
+    """
+    jobs = Job.query.filter(Job.asset_id == asset_id, Job.kind.notin_(job_queue.detached_kinds))
+    last_status = jobs.with_entities(Job.status).order_by(Job.id.desc()).limit(1).scalar_subquery()
+    Asset.query.filter(
+        Asset.id == asset_id,
+        ~jobs.filter(Job.status.in_(OUTSTANDING)).exists()
+    ).update({
+        'status': case((last_status == 'failed', 'failed'), else_='ready')
+    }, synchronize_session=False)
+
+
+job_queue = JobQueue()
+
+
+@on_commit(Job)
+def _wake_dispatcher(changes):
+    if any(op == 'insert' for op, _, _ in changes):
+        job_queue.wake()
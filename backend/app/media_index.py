@@ -0,0 +1,84 @@
+"""In-memory map from asset id to the files that can be served for it.
+
+/api/assets/<id>/file and /thumbnail are fetched by every screen for every
+slide; resolving the id here means repeat fetches never touch the database.
+Entries are dropped after any commit touching the asset or its renditions.
+"""
+import threading
+from collections import namedtuple
+
+from sqlalchemy.orm import selectinload
+
+from app.invalidation import on_commit
+from app.models import Asset, AssetVariant
+
+MediaEntry = namedtuple('MediaEntry', [
+    'id', 'type', 'path', 'mime_type', 'content_hash', 'thumbnail_path',
+    'width', 'height', 'codec', 'variants'
+])
+MediaVariant = namedtuple('MediaVariant', ['profile', 'path', 'mime_type', 'width', 'height'])
+
+
+class MediaIndex:
+    """Process-wide cache of MediaEntry keyed by asset id."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generation = 0
+
+    def invalidate(self, asset_ids=None):
+        """Forget the given assets, or everything when ``asset_ids`` is None."""
+        with self._lock:
+            self._generation += 1
+            if asset_ids is None:
+                self._entries = {}
+            else:
+                for asset_id in asset_ids:
+                    self._entries.pop(asset_id, None)
+
+    def get(self, asset_id):
+        """MediaEntry for ``asset_id``, or None if there is no such asset."""
+        entry = self._entries.get(asset_id)
+        if entry is not None:
+            return entry
+
+        generation = self._generation
+        asset = Asset.query.options(selectinload(Asset.variants)).filter(Asset.id == asset_id).first()
+        if asset is None:
+            return None
+        entry = MediaEntry(
+            asset.id, asset.type, asset.path, asset.mime_type, asset.content_hash, asset.thumbnail_path,
+            asset.width, asset.height, asset.codec,
+            # Renditions still being encoded (or that failed) are not served
+            tuple(MediaVariant(v.profile, v.path, v.mime_type, v.width, v.height)
+                  for v in asset.variants if v.status == 'ready')
+        )
+        with self._lock:
+            # A commit may have landed while loading; don't keep stale data.
+            if generation == self._generation:
+                self._entries[asset_id] = entry
+        return entry
+
+
+media_index = MediaIndex()
+
+
+def _changed_asset_ids(changes):
+    """Asset ids touched by ``changes``, or None when unknown (bulk query updates)."""
+    ids = set()
+    for op, _, asset_id in changes:
+        if asset_id is None and op != 'insert':
+            return None
+        ids.add(asset_id)
+    return ids
+
+
+@on_commit(Asset, snapshot=lambda asset: asset.id)
+def _invalidate_assets(changes):
+    media_index.invalidate(_changed_asset_ids(changes))
+
+
+@on_commit(AssetVariant, snapshot=lambda variant: variant.asset_id or (variant.asset and variant.asset.id))
+def _invalidate_variants(changes):
+    media_index.invalidate(_changed_asset_ids(changes))
@@ -0,0 +1,407 @@
+"""Media processing run as background jobs after an upload.
+
+Thumbnails and metadata (dimensions, and for video duration, codec, bitrate
+and frame rate via ffprobe) are produced here rather than in the upload
+request, which only stores the file and returns the asset as 'processing'.
+Metadata is cached by content hash, so identical files are probed once.
+
+Videos that are too large or not H.264 are then transcoded into the
+TRANSCODE_PROFILES renditions the Pi decodes comfortably, and large images
+are pre-scaled to the IMAGE_RENDITION_SIZES display sizes in every
+IMAGE_RENDITION_FORMATS format Pillow can write. The original file is kept
+so renditions can be re-encoded later.
+"""
+import hashlib
+import json
+import os
+import subprocess
+
+from flask import current_app
+from PIL import Image, ImageOps
+
+from app import db
+from app.background import in_os_thread
+from app.jobs import job_queue
+from app.media_store import media_path
+from app.models import Asset, AssetVariant, MediaInfo
+
+# Seconds an ffmpeg call may take before it is killed
+FFMPEG_TIMEOUT = 120
+FFPROBE_TIMEOUT = 30
+TRANSCODE_TIMEOUT = 4 * 3600
+
+THUMBNAIL_SIZE = (300, 300)
+
+# EXIF orientations that rotate the image by 90 or 270 degrees
+EXIF_ORIENTATION = 0x0112
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+# Pillow format, file extension and save options per rendition mime type
+IMAGE_ENCODINGS = {
+    'image/avif': ('AVIF', 'avif', {'quality': 60}),
+    'image/webp': ('WEBP', 'webp', {'quality': 80}),
+    'image/jpeg': ('JPEG', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'image/png': ('PNG', 'png', {'optimize': True}),
+}
+
+
+def thumbnail_relpath(content_hash):
+    """Thumbnails are stored under the content hash: same content, same thumbnail."""
+    return f"thumbnails/{content_hash}.jpg"
+
+
+def rendition_relpath(content_hash, profile, settings, ext):
+    """Renditions are stored under the source content hash, the profile name
+    and a digest of the encoding settings, so a changed profile gets a new
+    file (and URL) instead of reusing the old encode."""
+    digest = hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:8]
+    return f"renditions/{content_hash}-{profile}-{digest}.{ext}"
+
+
+def save_thumbnail(img, content_hash):
+    """Write a thumbnail of an already decoded image (``img`` is modified)."""
+    relpath = thumbnail_relpath(content_hash)
+    img.thumbnail(THUMBNAIL_SIZE)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.save(media_path(relpath), 'JPEG', quality=85)
+    return relpath
+
+
+def video_thumbnail(filepath, content_hash):
+    """Extract a thumbnail frame from a video with ffmpeg, or None on failure."""
+    relpath = thumbnail_relpath(content_hash)
+    if os.path.exists(media_path(relpath)):
+        return relpath
+    try:
+        # Extract frame at 1 second
+        cmd = [
+            'ffmpeg', '-i', filepath,
+            '-ss', '00:00:01',
+            '-vframes', '1',
+            '-q:v', '2',
+            '-s', '320x180',
+            '-f', 'image2',
+            media_path(relpath),
+            '-y'
+        ]
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       check=True, timeout=FFMPEG_TIMEOUT)
+        return relpath
+    except Exception as e:
+        print(f"Error generating thumbnail: {e}")
+    return None
+
+
+def parse_rate(value):
+    """Frame rate from ffprobe's '30000/1001' notation, or None."""
+    try:
+        num, _, den = value.partition('/')
+        rate = float(num) / float(den or 1)
+    except (AttributeError, ValueError, ZeroDivisionError):
+        return None
+    return round(rate, 3) if rate > 0 else None
+
+
+def probe_video(filepath):
+    """Duration, resolution, codec, bitrate and frame rate of a video via ffprobe."""
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-print_format', 'json',
+        '-show_format', '-show_streams',
+        filepath
+    ]
+    output = subprocess.run(cmd, capture_output=True, check=True, timeout=FFPROBE_TIMEOUT).stdout
+    data = json.loads(output)
+    fmt = data.get('format', {})
+    stream = next((s for s in data.get('streams', []) if s.get('codec_type') == 'video'), {})
+
+    width, height = stream.get('width'), stream.get('height')
+    # Phone videos are often stored landscape with a rotation flag
+    rotation = stream.get('tags', {}).get('rotate') or next(
+        (side.get('rotation') for side in stream.get('side_data_list', []) if 'rotation' in side), 0)
+    if width and height and int(float(rotation)) % 180:
+        width, height = height, width
+
+    bitrate = stream.get('bit_rate') or fmt.get('bit_rate')
+    duration = stream.get('duration') or fmt.get('duration')
+    return {
+        'duration': float(duration) if duration else None,
+        'width': width,
+        'height': height,
+        'codec': stream.get('codec_name'),
+        'bitrate': int(bitrate) if bitrate else None,
+        'frame_rate': parse_rate(stream.get('avg_frame_rate')) or parse_rate(stream.get('r_frame_rate'))
+    }
+
+
+def probe_image(img):
+    """Displayed size (EXIF orientation applied) and format of an opened image."""
+    width, height = img.size
+    if img.getexif().get(EXIF_ORIENTATION) in ROTATED_ORIENTATIONS:
+        width, height = height, width
+    return {
+        'width': width,
+        'height': height,
+        'codec': img.format.lower() if img.format else None
+    }
+
+
+def cached_media_info(content_hash, probe):
+    """MediaInfo for some content, calling ``probe()`` only if it was never seen."""
+    info = db.session.get(MediaInfo, content_hash)
+    if info is None:
+        info = MediaInfo(content_hash=content_hash, **probe())
+        db.session.merge(info)
+    return info
+
+
+def apply_media_info(asset, info):
+    asset.width, asset.height = info.width, info.height
+    asset.codec, asset.bitrate, asset.frame_rate = info.codec, info.bitrate, info.frame_rate
+    # Videos are uploaded with no duration; play them for their real length
+    if asset.type == 'video' and not asset.duration and info.duration:
+        asset.duration = max(1, round(info.duration))
+
+
+@job_queue.handler('process_asset')
+def process_asset(job):
+    """Fill in an uploaded asset's metadata, thumbnail and renditions."""
+    asset = db.session.get(Asset, job.asset_id)
+    if not asset:
+        return
+    if asset.type == 'image':
+        # Pillow work, off the gevent loop (ffmpeg runs as a cooperative subprocess)
+        in_os_thread(process_image, asset)
+    elif asset.type == 'video':
+        process_video(asset)
+
+
+def process_video(asset):
+    filepath = media_path(asset.path)
+    try:
+        apply_media_info(asset, cached_media_info(asset.content_hash, lambda: probe_video(filepath)))
+    except Exception as e:
+        print(f"Error reading media metadata: {e}")
+
+    if not asset.thumbnail_path:
+        asset.thumbnail_path = video_thumbnail(filepath, asset.content_hash)
+        if not asset.thumbnail_path:
+            # Fail the job (retried, then the asset is marked failed)
+            raise RuntimeError(f"No thumbnail could be extracted from {asset.path}")
+
+    # The original plays meanwhile: the asset is ready once this job ends
+    queue_renditions(asset)
+
+
+def fits(width, height, box_width, box_height):
+    """Whether width x height fits in the box, whatever the orientation."""
+    return max(width, height) <= max(box_width, box_height) and \
+        min(width, height) <= min(box_width, box_height)
+
+
+def transcode_profiles(asset):
+    """TRANSCODE_PROFILES worth producing for a video asset.
+
+    A profile is produced when it downscales the source, or when it is the
+    smallest profile the source fits in and the source is not already
+    Pi-friendly (not H.264, or above the profile's bitrate).
+    """
+    if not current_app.config['TRANSCODE_ENABLED'] or not asset.width or not asset.height:
+        return []
+    profiles = sorted(current_app.config['TRANSCODE_PROFILES'], key=lambda p: p['width'] * p['height'])
+    wanted = []
+    native_done = False
+    for profile in profiles:
+        if not fits(asset.width, asset.height, profile['width'], profile['height']):
+            wanted.append(profile)
+        elif not native_done:
+            native_done = True
+            if asset.codec != 'h264' or (asset.bitrate or 0) > profile['bitrate']:
+                wanted.append(profile)
+    return wanted
+
+
+def transcode(source, target, profile, asset):
+    """Encode ``source`` to an H.264/AAC MP4 within the profile's size and bitrate."""
+    box_width, box_height = profile['width'], profile['height']
+    if asset.height > asset.width:
+        box_width, box_height = box_height, box_width
+    bitrate = min(profile['bitrate'], asset.bitrate or profile['bitrate'])
+    tmp_target = f"{target}.part"
+    cmd = [
+        'ffmpeg', '-y', '-i', source,
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-vf', f"scale='min({box_width},iw)':'min({box_height},ih)'"
+               ":force_original_aspect_ratio=decrease:force_divisible_by=2",
+        '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'high', '-pix_fmt', 'yuv420p',
+        '-b:v', str(bitrate), '-maxrate', str(bitrate), '-bufsize', str(bitrate * 2),
+        '-c:a', 'aac', '-b:a', '128k',
+        '-movflags', '+faststart',
+        '-f', 'mp4', tmp_target
+    ]
+    try:
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                       check=True, timeout=TRANSCODE_TIMEOUT)
+        os.replace(tmp_target, target)
+    finally:
+        if os.path.exists(tmp_target):
+            os.remove(tmp_target)
+
+
+def pending_renditions(asset):
+    """The asset's video renditions left to encode, adding a pending
+    AssetVariant for each TRANSCODE_PROFILES rendition it lacks (failed
+    ones are tried again)."""
+    variants = {variant.profile: variant for variant in asset.variants}
+    for profile in transcode_profiles(asset):
+        variant = variants.get(profile['name'])
+        if variant is None:
+            # Named after the source content, so identical uploads share renditions
+            asset.variants.append(AssetVariant(
+                profile=profile['name'],
+                path=rendition_relpath(asset.content_hash, profile['name'], profile, 'mp4'),
+                mime_type='video/mp4',
+                status='pending'
+            ))
+        elif variant.status == 'failed':
+            variant.status = 'pending'
+    return [variant for variant in asset.variants if variant.status == 'pending']
+
+
+def queue_renditions(asset):
+    """Queue the transcode of the missing renditions; the job, or None if none is missing."""
+    if not pending_renditions(asset):
+        return None
+    return job_queue.enqueue('transcode_asset', asset=asset)
+
+
+@job_queue.handler('transcode_asset', limit=1, holds_asset=False)
+def transcode_asset(job):
+    """Encode the pending H.264 renditions of a video asset.
+
+    Each one is committed as soon as it is done, so screens can use it
+    right away. If the last attempt fails, the pending ones are marked
+    failed and screens keep getting the original.
+    """
+    asset = db.session.get(Asset, job.asset_id)
+    if not asset or asset.type != 'video':
+        return
+    source = media_path(asset.path)
+    profiles = {profile['name']: profile for profile in current_app.config['TRANSCODE_PROFILES']}
+
+    for variant in pending_renditions(asset):
+        if variant.profile not in profiles:
+            # Profile dropped from the configuration since it was queued
+            variant.status = 'failed'
+            continue
+        filepath = media_path(variant.path)
+        try:
+            if not os.path.exists(filepath):
+                transcode(source, filepath, profiles[variant.profile], asset)
+            info = probe_video(filepath)
+        except Exception:
+            if job.attempts >= current_app.config['JOB_MAX_ATTEMPTS']:
+                for pending in asset.variants:
+                    if pending.status == 'pending':
+                        pending.status = 'failed'
+                db.session.commit()
+            raise
+        variant.width, variant.height = info['width'], info['height']
+        variant.codec, variant.bitrate = info['codec'], info['bitrate']
+        variant.file_size = os.path.getsize(filepath)
+        variant.status = 'ready'
+        db.session.commit()
+
+
+def image_rendition_sizes(asset):
+    """IMAGE_RENDITION_SIZES the image is larger than, largest first."""
+    if not asset.width or not asset.height:
+        return []
+    sizes = [size for size in current_app.config['IMAGE_RENDITION_SIZES']
+             if not fits(asset.width, asset.height, size['width'], size['height'])]
+    return sorted(sizes, key=lambda size: size['width'] * size['height'], reverse=True)
+
+
+def image_rendition_formats(has_alpha):
+    """Mime types to encode renditions in; PNG stands in for JPEG with transparency."""
+    Image.init()
+    formats = []
+    for mime_type in current_app.config['IMAGE_RENDITION_FORMATS']:
+        if mime_type == 'image/jpeg' and has_alpha:
+            mime_type = 'image/png'
+        if IMAGE_ENCODINGS[mime_type][0] in Image.SAVE:
+            formats.append(mime_type)
+    return formats
+
+
+def oriented_box(size, width, height):
+    """The size's box turned to match a width x height image."""
+    if height > width:
+        return size['height'], size['width']
+    return size['width'], size['height']
+
+
+def process_image(asset):
+    """Metadata, renditions and thumbnail of an image from a single decode.
+
+    The file is decoded straight at the largest size needed (a reduced
+    scale for JPEGs, through draft mode) and rotated per its EXIF
+    orientation; each smaller rendition, then the thumbnail, is scaled down
+    from the previous one. Animated images only get a thumbnail, of their
+    first frame.
+    """
+    existing = {(variant.profile, variant.mime_type) for variant in asset.variants}
+    thumbnail_path = thumbnail_relpath(asset.content_hash)
+
+    with Image.open(media_path(asset.path)) as source:
+        apply_media_info(asset, cached_media_info(asset.content_hash, lambda: probe_image(source)))
+        # A rendition would keep only the first frame: animations are served as uploaded
+        sizes = [] if getattr(source, 'is_animated', False) else image_rendition_sizes(asset)
+        has_alpha = source.mode in ('RGBA', 'LA', 'PA') or 'transparency' in source.info
+        formats = image_rendition_formats(has_alpha)
+        missing = [(size, mime_type) for size in sizes for mime_type in formats
+                   if (size['name'], mime_type) not in existing]
+        if not missing and os.path.exists(media_path(thumbnail_path)):
+            asset.thumbnail_path = thumbnail_path
+            return
+
+        # Before rotation: turning both the image and the box changes nothing
+        box = oriented_box(sizes[0], *source.size) if sizes else THUMBNAIL_SIZE
+        source.draft(None, box)
+        img = ImageOps.exif_transpose(source)
+
+    img = img.convert('RGBA' if has_alpha else 'RGB')
+    for size in sizes:
+        img.thumbnail(oriented_box(size, *img.size), Image.LANCZOS)
+        for mime_type in formats:
+            if (size, mime_type) in missing:
+                asset.variants.append(save_rendition(img, asset.content_hash, size, mime_type))
+
+    asset.thumbnail_path = save_thumbnail(img, asset.content_hash)
+
+
+def save_rendition(img, content_hash, size, mime_type):
+    """Encode ``img`` as a rendition file (unless already stored) and return its AssetVariant."""
+    pil_format, ext, options = IMAGE_ENCODINGS[mime_type]
+    profile = size['name']
+    # Named after the source content, so identical uploads share renditions
+    relpath = rendition_relpath(content_hash, profile, {'size': size, 'options': options}, ext)
+    filepath = media_path(relpath)
+    if not os.path.exists(filepath):
+        tmp_path = f"{filepath}.part"
+        try:
+            img.save(tmp_path, pil_format, **options)
+            os.replace(tmp_path, filepath)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return AssetVariant(
+        profile=profile,
+        path=relpath,
+        mime_type=mime_type,
+        width=img.width,
+        height=img.height,
+        codec=pil_format.lower(),
+        file_size=os.path.getsize(filepath)
+    )
@@ -0,0 +1,282 @@
+"""Content-addressed storage for media files under UPLOAD_FOLDER.
+
+Uploads are hashed (SHA-256) while they stream to disk and stored as
+``<subfolder>/<hash>.<ext>``. Identical uploads share one file; a file is
+only removed once no Asset row references it any more.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+
+from flask import abort, current_app, request, send_file
+
+from app.models import Asset, AssetVariant
+
+# Read size used when hashing or copying media files
+CHUNK_SIZE = 1024 * 1024
+
+# Bytes read to recognise a file's format
+SNIFF_BYTES = 64
+
+# Major brands of ISO base media files that are still images (HEIF/HEIC, AVIF);
+# any other brand (isom, mp42, 3gp5, MSNV, dash, f4v...) is MP4 video
+IMAGE_BRANDS = {b'heic', b'heix', b'heim', b'heis', b'hevc', b'hevx', b'mif1', b'msf1', b'avif', b'avis'}
+
+# EBML element id of the DocType ('webm', 'matroska')
+EBML_DOCTYPE = b'\x42\x82'
+
+# Files named after their content hash (renditions: plus profile and settings
+# digest) never change; caches may keep them for good
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{64}(-\w+-[0-9a-f]{8})?\.\w+$')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+# Stored file extension per sniffed mime type
+MIME_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+    'video/mp4': 'mp4',
+    'video/quicktime': 'mov',
+    'video/webm': 'webm',
+}
+
+
+def hash_file(filepath):
+    """SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def ebml_doctype(head):
+    """DocType of an EBML (Matroska/WebM) header, e.g. b'webm', or None."""
+    index = head.find(EBML_DOCTYPE, 4)
+    if index < 0 or index + 3 > len(head) or not head[index + 2]:
+        return None
+    # Size is a variable-length integer: its first bit set gives its width
+    first = head[index + 2]
+    width = 9 - first.bit_length()
+    size = first & (0xff >> width)
+    for byte in head[index + 3:index + 2 + width]:
+        size = size << 8 | byte
+    start = index + 2 + width
+    return head[start:start + size]
+
+
+def sniff_mime(head):
+    """Mime type of a media file from its first SNIFF_BYTES bytes (magic numbers), or None."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:8] == b'ftyp':
+        # ISO base media also holds HEIC/AVIF images, which are not videos
+        brand = head[8:12]
+        if brand == b'qt  ':
+            return 'video/quicktime'
+        return None if brand in IMAGE_BRANDS else 'video/mp4'
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        # Matroska (.mkv) shares the container but browsers only play WebM
+        return 'video/webm' if ebml_doctype(head) == b'webm' else None
+    return None
+
+
+def sniff_file(filepath):
+    with open(filepath, 'rb') as f:
+        return sniff_mime(f.read(SNIFF_BYTES))
+
+
+def media_path(relpath):
+    """Absolute path of a file stored under UPLOAD_FOLDER."""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], relpath)
+
+
+def save_stream(stream, subfolder):
+    """Write ``stream`` to a temporary file in ``subfolder`` in one pass,
+    hashing, sizing and sniffing its format as it goes.
+
+    Returns ``(tmp_path, content_hash, size, mime_type)``, mime_type being
+    None for unrecognised content; pass tmp_path to commit_file() or
+    discard() afterwards.
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix='.upload-', dir=media_path(subfolder))
+    digest = hashlib.sha256()
+    size = 0
+    mime_type = None
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                if not size:
+                    mime_type = sniff_mime(chunk[:SNIFF_BYTES])
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        discard(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size, mime_type
+
+
+def preallocate(relpath, size):
+    """Create (or reset) a file of ``size`` bytes that chunks are written into."""
+    with open(media_path(relpath), 'wb') as f:
+        f.truncate(size)
+
+
+def write_at(relpath, offset, stream, length):
+    """Copy ``length`` bytes from ``stream`` into the file at ``offset``.
+
+    Memory use stays at one CHUNK_SIZE buffer whatever the length. Returns
+    the number of bytes actually copied (less if the stream ended early).
+    """
+    written = 0
+    with open(media_path(relpath), 'r+b') as out:
+        out.seek(offset)
+        while written < length:
+            chunk = stream.read(min(CHUNK_SIZE, length - written))
+            if not chunk:
+                break
+            out.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def claim_file(relpath):
+    """Move a file to a temporary path only the caller knows, or None if it is gone.
+
+    The rename is atomic: of two requests claiming the same file, one gets it.
+    """
+    filepath = media_path(relpath)
+    fd, tmp_path = tempfile.mkstemp(prefix='.claimed-', dir=os.path.dirname(filepath))
+    os.close(fd)
+    try:
+        os.replace(filepath, tmp_path)
+    except FileNotFoundError:
+        os.remove(tmp_path)
+        return None
+    return tmp_path
+
+
+def release_file(tmp_path, relpath):
+    """Undo claim_file(): put the file back at ``relpath`` if it is still around."""
+    if os.path.exists(tmp_path):
+        os.replace(tmp_path, media_path(relpath))
+
+
+def link_copy(filepath):
+    """A new name for the same file (hard link), to hand over while keeping the original."""
+    fd, tmp_path = tempfile.mkstemp(prefix='.link-', dir=os.path.dirname(filepath))
+    os.close(fd)
+    os.remove(tmp_path)
+    os.link(filepath, tmp_path)
+    return tmp_path
+
+
+def content_path(subfolder, content_hash, ext):
+    """Relative path a file with this hash is stored under."""
+    return f"{subfolder}/{content_hash}.{ext}" if ext else f"{subfolder}/{content_hash}"
+
+
+def commit_file(tmp_path, relpath):
+    """Atomically move a temporary file into place (dropping it if already stored)."""
+    final_path = media_path(relpath)
+    if os.path.exists(final_path):
+        discard(tmp_path)
+    else:
+        os.replace(tmp_path, final_path)
+    return final_path
+
+
+def discard(tmp_path):
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+def find_duplicate(content_hash, asset_type):
+    """An existing asset of the same type with identical content, or None."""
+    return Asset.query.filter(
+        Asset.content_hash == content_hash,
+        Asset.type == asset_type
+    ).order_by(Asset.id).first()
+
+
+def unreferenced(relpaths):
+    """Subset of ``relpaths`` no Asset row uses as its file or thumbnail, and
+    no AssetVariant as its rendition.
+
+    Call before committing a delete, with the deleted asset already removed
+    from the session (so it no longer counts), then remove_files() after.
+    """
+    relpaths = {p for p in relpaths if p}
+    if not relpaths:
+        return set()
+    rows = Asset.query.with_entities(Asset.path, Asset.thumbnail_path).filter(
+        Asset.path.in_(relpaths) | Asset.thumbnail_path.in_(relpaths)
+    ).all()
+    used = {p for row in rows for p in row}
+    used.update(path for (path,) in AssetVariant.query.with_entities(AssetVariant.path)
+                .filter(AssetVariant.path.in_(relpaths)))
+    return relpaths - used
+
+
+def remove_files(relpaths):
+    for relpath in relpaths:
+        filepath = media_path(relpath)
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+
+def is_content_addressed(relpath):
+    return bool(CONTENT_ADDRESSED.match(os.path.basename(relpath)))
+
+
+def content_etag(relpath, content_hash=None):
+    """Strong ETag for a stored file: its hash-based name, else its content hash."""
+    if is_content_addressed(relpath):
+        return os.path.basename(relpath)
+    return content_hash
+
+
+def send_media(relpath, mime_type=None, etag=None, immutable=False):
+    """Response sending a stored file.
+
+    ``etag`` should be derived from the content hash, so it is strong and
+    identical across restarts and servers; a matching If-None-Match gets a
+    304 without touching the file. ``immutable`` marks the URL as never
+    changing content. With MEDIA_OFFLOAD set, the reverse proxy sends the
+    file (and handles Range); otherwise Flask does, Range/206 included.
+    """
+    mime_type = mime_type or mimetypes.guess_type(relpath)[0] or 'application/octet-stream'
+    cache_control = IMMUTABLE_CACHE if immutable else 'no-cache'
+
+    if etag and etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        offload = current_app.config['MEDIA_OFFLOAD']
+        if offload == 'x-accel-redirect':
+            response = current_app.response_class(mimetype=mime_type)
+            response.headers['X-Accel-Redirect'] = current_app.config['MEDIA_ACCEL_PREFIX'] + relpath
+        elif offload == 'x-sendfile':
+            response = current_app.response_class(mimetype=mime_type)
+            response.headers['X-Sendfile'] = os.path.realpath(media_path(relpath))
+        else:
+            filepath = media_path(relpath)
+            if not os.path.isfile(filepath):
+                abort(404)
+            response = send_file(filepath, mimetype=mime_type, etag=etag or True, conditional=True)
+            # Werkzeug only advertises ranges on 206 responses; players seek sooner if told upfront
+            response.headers['Accept-Ranges'] = 'bytes'
+
+    if etag:
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
@@ -1,6 +1,37 @@
+import json
 from datetime import datetime
+from sqlalchemy import and_, or_, func
+from sqlalchemy.orm import joinedload, validates
 from app import db
 
+
+ALL_DAYS_MASK = 0b1111111
+
+
+def days_to_mask(days):
+    """Bitmask (bit 0 = Monday) for a "0,1,2" string or a list of weekdays."""
+    if isinstance(days, str):
+        days = [d for d in days.split(',') if d]
+    mask = 0
+    for day in days or []:
+        mask |= 1 << int(day)
+    return mask
+
+
+def mask_to_days(mask):
+    """Sorted weekday list for a day bitmask."""
+    return [day for day in range(7) if mask & (1 << day)]
+
+
+def time_to_minute(value):
+    """Minute of day for a time, or None."""
+    return value.hour * 60 + value.minute if value is not None else None
+
+# Items are spread POSITION_GAP apart so one can be moved between two others
+# by updating only its own row; see app.api.playlists
+POSITION_GAP = 1024
+
+
 # Association table for playlist assets with ordering
 class PlaylistAsset(db.Model):
     __tablename__ = 'playlist_assets'
@@ -18,11 +49,58 @@ class PlaylistAsset(db.Model):
     schedule_end_time = db.Column(db.Time, nullable=True)    # e.g., 18:00
     schedule_days = db.Column(db.String(20), nullable=True)  # e.g., "0,1,2,3,4" (Mon-Fri)
     
+    # Integer mirrors of the fields above, kept in sync by the validators below
+    # so visibility can be filtered in SQL: bit n of the mask = weekday n,
+    # minutes are minutes since midnight.
+    schedule_days_mask = db.Column(db.Integer, nullable=True)
+    schedule_start_minute = db.Column(db.Integer, nullable=True)
+    schedule_end_minute = db.Column(db.Integer, nullable=True)
+    
     # Optional date range (for seasonal/event content)
     schedule_start_date = db.Column(db.Date, nullable=True)
     schedule_end_date = db.Column(db.Date, nullable=True)
     
-    asset = db.relationship('Asset', backref='playlist_associations')
+    asset = db.relationship('Asset', backref=db.backref('playlist_associations',
+                                                        cascade='all, delete-orphan'))
+    
+    __table_args__ = (
+        db.Index('ix_playlist_assets_playlist_position', 'playlist_id', 'position'),
+    )
+    
+    @validates('schedule_days')
+    def _sync_schedule_days(self, key, value):
+        self.schedule_days_mask = days_to_mask(value) or None
+        return value
+    
+    @validates('schedule_start_time', 'schedule_end_time')
+    def _sync_schedule_minutes(self, key, value):
+        if key == 'schedule_start_time':
+            self.schedule_start_minute = time_to_minute(value)
+        else:
+            self.schedule_end_minute = time_to_minute(value)
+        return value
+    
+    @classmethod
+    def visible_at(cls, now):
+        """SQL condition matching items whose per-item schedule allows ``now``.
+        
+        End minutes are exclusive; a start after the end spans midnight.
+        """
+        minute = now.hour * 60 + now.minute
+        today = now.date()
+        start, end = cls.schedule_start_minute, cls.schedule_end_minute
+        return and_(
+            or_(cls.schedule_start_date.is_(None), cls.schedule_start_date <= today),
+            or_(cls.schedule_end_date.is_(None), cls.schedule_end_date >= today),
+            or_(cls.schedule_days_mask.is_(None), cls.schedule_days_mask.op('&')(1 << now.weekday()) != 0),
+            or_(
+                and_(start.is_(None), end.is_(None)),
+                and_(end.is_(None), start <= minute),
+                and_(start.is_(None), minute < end),
+                and_(start <= end, start <= minute, minute < end),
+                and_(start > end, or_(minute >= start, minute < end))
+            )
+        )
     
     def to_dict(self):
         return {
@@ -33,7 +111,7 @@ class PlaylistAsset(db.Model):
             'custom_duration': self.custom_duration,
             'schedule_start_time': self.schedule_start_time.strftime('%H:%M') if self.schedule_start_time else None,
             'schedule_end_time': self.schedule_end_time.strftime('%H:%M') if self.schedule_end_time else None,
-            'schedule_days': [int(d) for d in self.schedule_days.split(',') if d] if self.schedule_days else None,
+            'schedule_days': mask_to_days(self.schedule_days_mask) if self.schedule_days_mask else None,
             'schedule_start_date': self.schedule_start_date.isoformat() if self.schedule_start_date else None,
             'schedule_end_date': self.schedule_end_date.isoformat() if self.schedule_end_date else None,
             'asset': self.asset.to_dict() if self.asset else None
@@ -43,6 +121,11 @@ class PlaylistAsset(db.Model):
 
 class Asset(db.Model):
     __tablename__ = 'assets'
+    __table_args__ = (
+        # Keyset pagination of the listing, newest first (optionally per type)
+        db.Index('ix_assets_created_at_id', 'created_at', 'id'),
+        db.Index('ix_assets_type_created_at_id', 'type', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
@@ -52,14 +135,19 @@ class Asset(db.Model):
     duration = db.Column(db.Integer, default=10)  # seconds
     mime_type = db.Column(db.String(100), nullable=True)
     file_size = db.Column(db.Integer, nullable=True)  # bytes
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 of the file
     width = db.Column(db.Integer, nullable=True)
     height = db.Column(db.Integer, nullable=True)
+    codec = db.Column(db.String(50), nullable=True)  # e.g. 'h264', 'jpeg'
+    bitrate = db.Column(db.Integer, nullable=True)  # bits per second (video)
+    frame_rate = db.Column(db.Float, nullable=True)  # frames per second (video)
     is_active = db.Column(db.Boolean, default=True)
+    status = db.Column(db.String(20), nullable=False, default='ready')  # 'processing', 'ready', 'failed'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def to_dict(self):
-        return {
+    def to_dict(self, include_variants=False):
+        data = {
             'id': self.id,
             'name': self.name,
             'type': self.type,
@@ -68,12 +156,86 @@ class Asset(db.Model):
             'duration': self.duration,
             'mime_type': self.mime_type,
             'file_size': self.file_size,
+            'content_hash': self.content_hash,
             'width': self.width,
             'height': self.height,
+            'codec': self.codec,
+            'bitrate': self.bitrate,
+            'frame_rate': self.frame_rate,
             'is_active': self.is_active,
+            'status': self.status,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+        if include_variants:
+            data['variants'] = [variant.to_dict() for variant in self.variants]
+        return data
+
+
+class AssetVariant(db.Model):
+    """A rendition of an asset's file (e.g. a Pi-friendly H.264 encode).
+    
+    Files live under renditions/ named after the source content hash (plus
+    profile and settings digest), so assets sharing content share
+    renditions. The original is always kept.
+    """
+    __tablename__ = 'asset_variants'
+    __table_args__ = (
+        db.UniqueConstraint('asset_id', 'profile', 'mime_type', name='uq_asset_variants_profile'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    asset_id = db.Column(db.Integer, db.ForeignKey('assets.id', ondelete='CASCADE'), nullable=False, index=True)
+    profile = db.Column(db.String(50), nullable=False)  # e.g. '720p'
+    path = db.Column(db.String(500), nullable=False)
+    mime_type = db.Column(db.String(100), nullable=False)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    codec = db.Column(db.String(50), nullable=True)
+    bitrate = db.Column(db.Integer, nullable=True)
+    file_size = db.Column(db.Integer, nullable=True)
+    # pending (being encoded), ready or failed; only ready renditions are served
+    status = db.Column(db.String(20), nullable=False, default='ready', server_default='ready')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    asset = db.relationship('Asset', backref=db.backref('variants', cascade='all, delete-orphan', passive_deletes=True))
+    
+    def copy(self):
+        """Same rendition, for another asset with the same content."""
+        return AssetVariant(**{
+            column.name: getattr(self, column.name)
+            for column in self.__table__.columns if column.name not in ('id', 'asset_id', 'created_at')
+        })
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'asset_id': self.asset_id,
+            'profile': self.profile,
+            'path': self.path,
+            'mime_type': self.mime_type,
+            'width': self.width,
+            'height': self.height,
+            'codec': self.codec,
+            'bitrate': self.bitrate,
+            'file_size': self.file_size,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class MediaInfo(db.Model):
+    """Metadata read from a media file, cached by its content hash."""
+    __tablename__ = 'media_info'
+    
+    content_hash = db.Column(db.String(64), primary_key=True)
+    duration = db.Column(db.Float, nullable=True)  # seconds (video)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    codec = db.Column(db.String(50), nullable=True)
+    bitrate = db.Column(db.Integer, nullable=True)
+    frame_rate = db.Column(db.Float, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
 class Playlist(db.Model):
@@ -84,6 +246,9 @@ class Playlist(db.Model):
     description = db.Column(db.Text, nullable=True)
     is_active = db.Column(db.Boolean, default=True)
     is_default = db.Column(db.Boolean, default=False)
+    # Denormalized from the items, maintained by app.playlist_totals
+    asset_count = db.Column(db.Integer, nullable=False, default=0)
+    total_duration = db.Column(db.Integer, nullable=False, default=0)  # seconds
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -96,28 +261,57 @@ class Playlist(db.Model):
     schedules = db.relationship('Schedule', backref='playlist', lazy='dynamic',
                                 cascade='all, delete-orphan')
     
-    def to_dict(self, include_assets=False):
+    def to_dict(self, include_assets=False, items=None):
+        """``items`` may be preloaded, see playlists_to_dicts()."""
         data = {
             'id': self.id,
             'name': self.name,
             'description': self.description,
             'is_active': self.is_active,
             'is_default': self.is_default,
-            'asset_count': self.playlist_assets.count(),
-            'total_duration': self.get_total_duration(),
+            'asset_count': self.asset_count or 0,
+            'total_duration': self.total_duration or 0,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
         if include_assets:
-            data['assets'] = [pa.to_dict() for pa in self.playlist_assets.order_by(PlaylistAsset.position).all()]
+            if items is None:
+                items = self.playlist_assets.options(joinedload(PlaylistAsset.asset)).all()
+            data['assets'] = [pa.to_dict() for pa in items]
         return data
     
     def get_total_duration(self):
-        total = 0
-        for pa in self.playlist_assets.all():
-            duration = pa.custom_duration if pa.custom_duration else pa.asset.duration
-            total += duration if duration else 0
-        return total
+        return self.total_duration or 0
+
+
+def playlist_stats(playlist_ids=None):
+    """{playlist_id: (asset_count, total_duration)} computed from the items.
+    
+    One grouped query. Items without a custom duration count their asset's;
+    playlists without items are missing from the result. All playlists
+    when ``playlist_ids`` is None.
+    """
+    duration = func.coalesce(func.nullif(PlaylistAsset.custom_duration, 0), Asset.duration, 0)
+    query = db.session.query(PlaylistAsset.playlist_id, func.count(PlaylistAsset.id), func.sum(duration))\
+        .outerjoin(Asset, Asset.id == PlaylistAsset.asset_id)\
+        .group_by(PlaylistAsset.playlist_id)
+    if playlist_ids is not None:
+        query = query.filter(PlaylistAsset.playlist_id.in_(playlist_ids))
+    return {playlist_id: (count, total or 0) for playlist_id, count, total in query}
+
+
+def playlists_to_dicts(playlists, include_assets=False):
+    """to_dict() of many playlists with a fixed number of queries."""
+    items = {}
+    if include_assets:
+        for pa in PlaylistAsset.query.options(joinedload(PlaylistAsset.asset))\
+                .filter(PlaylistAsset.playlist_id.in_([p.id for p in playlists]))\
+                .order_by(PlaylistAsset.playlist_id, PlaylistAsset.position):
+            items.setdefault(pa.playlist_id, []).append(pa)
+    return [
+        p.to_dict(include_assets=include_assets, items=items.get(p.id, []))
+        for p in playlists
+    ]
 
 
 class Schedule(db.Model):
@@ -134,6 +328,11 @@ class Schedule(db.Model):
     # Days of week (stored as comma-separated: "0,1,2,3,4,5,6" for Mon-Sun)
     days_of_week = db.Column(db.String(20), default="0,1,2,3,4,5,6")
     
+    # Integer mirrors of the fields above, kept in sync by the validators below
+    days_mask = db.Column(db.Integer, nullable=False, default=ALL_DAYS_MASK)
+    start_minute = db.Column(db.Integer, nullable=True)
+    end_minute = db.Column(db.Integer, nullable=True)
+    
     # Date range (optional)
     start_date = db.Column(db.Date, nullable=True)
     end_date = db.Column(db.Date, nullable=True)
@@ -145,6 +344,19 @@ class Schedule(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    @validates('days_of_week')
+    def _sync_days_mask(self, key, value):
+        self.days_mask = days_to_mask(value)
+        return value
+    
+    @validates('start_time', 'end_time')
+    def _sync_minutes(self, key, value):
+        if key == 'start_time':
+            self.start_minute = time_to_minute(value)
+        else:
+            self.end_minute = time_to_minute(value)
+        return value
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -153,7 +365,7 @@ class Schedule(db.Model):
             'playlist_name': self.playlist.name if self.playlist else None,
             'start_time': self.start_time.strftime('%H:%M') if self.start_time else None,
             'end_time': self.end_time.strftime('%H:%M') if self.end_time else None,
-            'days_of_week': [int(d) for d in self.days_of_week.split(',') if d],
+            'days_of_week': mask_to_days(self.days_mask),
             'start_date': self.start_date.isoformat() if self.start_date else None,
             'end_date': self.end_date.isoformat() if self.end_date else None,
             'is_recurring': self.is_recurring,
@@ -182,7 +394,15 @@ class SystemConfig(db.Model):
 
     @classmethod
     def trigger_player_refresh(cls):
-        """Update the player_refresh_token to force connected screens to reload immediately."""
+        """Update the player_refresh_token to force connected screens to reload immediately.
+        
+        Within a unit of work the token is bumped once, in the same commit.
+        """
+        from app.unit_of_work import before_commit
+        before_commit(cls._bump_refresh_token)
+    
+    @classmethod
+    def _bump_refresh_token(cls):
         import time
         config = cls.query.get('player_refresh_token')
         if not config:
@@ -194,6 +414,12 @@ class SystemConfig(db.Model):
 
 class ActivityLog(db.Model):
     __tablename__ = 'activity_logs'
+    __table_args__ = (
+        # SQLite appends the rowid (id) to every index, so both also serve
+        # the (created_at, id) order of the cursor-paginated listing
+        db.Index('ix_activity_logs_entity_type_created_at', 'entity_type', 'created_at'),
+        db.Index('ix_activity_logs_created_at', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     action = db.Column(db.String(100), nullable=False)
@@ -214,16 +440,72 @@ class ActivityLog(db.Model):
     
     @classmethod
     def log(cls, action, details=None, entity_type=None, entity_id=None):
-        """Helper method to create activity log entry"""
-        log_entry = cls(
-            action=action,
-            details=details,
-            entity_type=entity_type,
-            entity_id=entity_id
-        )
-        db.session.add(log_entry)
-        db.session.commit()
-        return log_entry
+        """Record an activity; like any other write, it is only kept once the
+        caller commits.
+        
+        The entry is written asynchronously, in batches (see app.activity_log).
+        """
+        from app.activity_log import activity_log, entry
+        from app.unit_of_work import after_commit
+        values = entry(action, details, entity_type, entity_id)
+        after_commit(lambda: activity_log.put(values))
+
+
+class ActivityLogDaily(db.Model):
+    """Number of activity log entries per day and action.
+    
+    Maintained by the activity log writer and kept after the raw rows are
+    compacted away, so activity statistics never scan activity_logs.
+    """
+    __tablename__ = 'activity_log_daily'
+    
+    day = db.Column(db.Date, primary_key=True)
+    action = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat(),
+            'action': self.action,
+            'count': self.count
+        }
+
+
+class Job(db.Model):
+    """A unit of background work, persisted so it survives restarts."""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_id', 'status', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    asset_id = db.Column(db.Integer, db.ForeignKey('assets.id', ondelete='CASCADE'), nullable=True, index=True)
+    payload = db.Column(db.Text, nullable=True)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'running', 'done', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    not_before = db.Column(db.DateTime, nullable=True)  # a failed job's next try
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    asset = db.relationship('Asset', passive_deletes=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'asset_id': self.asset_id,
+            'payload': json.loads(self.payload) if self.payload else {},
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'not_before': self.not_before.isoformat() if self.not_before else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
 
 
 class Widget(db.Model):
@@ -249,3 +531,90 @@ class Widget(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+
+
+class Screen(db.Model):
+    __tablename__ = 'screens'
+    
+    id = db.Column(db.String(64), primary_key=True)  # chosen by the player
+    last_heartbeat = db.Column(db.DateTime, nullable=True)
+    playlist_id = db.Column(db.Integer, nullable=True)
+    current_item_id = db.Column(db.Integer, nullable=True)  # PlaylistAsset id
+    current_asset_id = db.Column(db.Integer, nullable=True)
+    resolution_width = db.Column(db.Integer, nullable=True)
+    resolution_height = db.Column(db.Integer, nullable=True)
+    software_version = db.Column(db.String(50), nullable=True)
+    ip_address = db.Column(db.String(45), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'last_heartbeat': self.last_heartbeat.isoformat() if self.last_heartbeat else None,
+            'playlist_id': self.playlist_id,
+            'current_item_id': self.current_item_id,
+            'current_asset_id': self.current_asset_id,
+            'resolution': {'width': self.resolution_width, 'height': self.resolution_height}
+                          if self.resolution_width else None,
+            'software_version': self.software_version,
+            'ip_address': self.ip_address,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class UploadSession(db.Model):
+    """A chunked upload in progress; chunks are written straight into a
+    preallocated ``uploads/<id>.part`` file."""
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    filename = db.Column(db.String(255), nullable=False)
+    name = db.Column(db.String(255), nullable=False)
+    type = db.Column(db.String(50), nullable=False)  # image, video
+    duration = db.Column(db.Integer, default=10)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    chunks = db.relationship('UploadChunk', backref='upload', lazy='dynamic', cascade='all, delete-orphan')
+    
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+    
+    def chunk_length(self, index):
+        """Expected byte length of chunk ``index`` (the last one may be short)."""
+        return min(self.chunk_size, self.total_size - index * self.chunk_size)
+    
+    def to_dict(self):
+        received = sorted(index for (index,) in self.chunks.with_entities(UploadChunk.index))
+        missing = sorted(set(range(self.chunk_count)) - set(received))
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'name': self.name,
+            'type': self.type,
+            'total_size': self.total_size,
+            'chunk_size': self.chunk_size,
+            'chunk_count': self.chunk_count,
+            'received_chunks': len(received),
+            'received_bytes': sum(self.chunk_length(index) for index in received),
+            'missing_chunks': missing,
+            'complete': not missing,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class UploadChunk(db.Model):
+    """A chunk fully written to its upload's part file.
+    
+    One insert-only row per chunk, so chunks sent in parallel never
+    overwrite each other's progress.
+    """
+    __tablename__ = 'upload_chunks'
+    
+    upload_id = db.Column(db.String(32), db.ForeignKey('upload_sessions.id', ondelete='CASCADE'), primary_key=True)
+    index = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
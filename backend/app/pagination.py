@@ -0,0 +1,36 @@
+"""Keyset (cursor) pagination over (created_at, id), newest first.
+
+A cursor is an opaque token for the last row of a page; the next page is
+everything strictly older, which an index on created_at finds directly
+however deep the page (no OFFSET scan).
+"""
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(row):
+    """Opaque position after ``row`` (anything with created_at and id)."""
+    raw = f"{row.created_at.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor; ValueError if it is malformed."""
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    created_at, row_id = raw.split('|')
+    return datetime.fromisoformat(created_at), int(row_id)
+
+
+def after_cursor(model, cursor):
+    """SQL condition matching the rows of ``model`` that come after ``cursor``."""
+    created_at, row_id = decode_cursor(cursor)
+    return or_(
+        model.created_at < created_at,
+        and_(model.created_at == created_at, model.id < row_id)
+    )
+
+
+def newest_first(model):
+    return model.created_at.desc(), model.id.desc()
@@ -0,0 +1,75 @@
+"""What the player shows at a given moment, and when that next changes."""
+import hashlib
+import json
+from datetime import timedelta
+
+from app.playlist_cache import playlist_cache
+from app.schedule_engine import schedule_engine
+
+
+def resolve_content(now):
+    """Return ``(playlist, active_schedule, items)`` playing at ``now``.
+
+    ``playlist`` is a CompiledPlaylist (None when there is nothing to play),
+    ``active_schedule`` an ActiveSchedule or None, ``items`` the visible
+    item payloads in play order.
+    """
+    active_schedule = schedule_engine.resolve(now)
+
+    # Get playlist, falling back to the default (or first active) playlist
+    playlist = None
+    if active_schedule:
+        playlist = playlist_cache.get(active_schedule.playlist_id)
+    if not playlist:
+        playlist = playlist_cache.fallback()
+
+    items = playlist.visible_items(now) if playlist else []
+    return playlist, active_schedule, items
+
+
+def content_etag(playlist, items, active_schedule):
+    """Stable version of the resolved player payload (timestamp excluded)."""
+    digest = hashlib.sha1(json.dumps({
+        'playlist': [playlist.id, playlist.name],
+        'schedule': list(active_schedule) if active_schedule else None,
+        'items': items
+    }, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def next_change(now, playlist):
+    """First moment after ``now`` where the schedule or visible items may change."""
+    change = schedule_engine.next_change(now)
+    item_change = playlist.next_change(now) if playlist else None
+    if item_change and item_change < change:
+        change = item_change
+    return change
+
+
+def build_timeline(start, hours):
+    """Resolved content segments from ``start`` for ``hours`` hours.
+
+    Consecutive moments resolving to the same content are merged, so each
+    segment boundary is a real change of what the screen should show.
+    """
+    end = start + timedelta(hours=hours)
+    segments = []
+    moment = start
+    while moment < end:
+        playlist, active_schedule, items = resolve_content(moment)
+        segment_end = min(next_change(moment, playlist), end)
+        etag = content_etag(playlist, items, active_schedule) if playlist else None
+
+        if segments and segments[-1]['etag'] == etag:
+            segments[-1]['end'] = segment_end
+        else:
+            segments.append({
+                'start': moment,
+                'end': segment_end,
+                'playlist': {'id': playlist.id, 'name': playlist.name} if playlist else None,
+                'schedule_id': active_schedule.id if active_schedule else None,
+                'items': items,
+                'etag': etag
+            })
+        moment = segment_end
+    return segments
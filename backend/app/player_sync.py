@@ -0,0 +1,78 @@
+"""In-memory snapshot of the player management keys with change notification.
+
+Screens only care about the refresh token and the last remote command. Those
+keys are mirrored here and every committed write bumps a version number and
+wakes the waiting push connections, so screens never read system_config.
+"""
+import threading
+import time
+
+from app.invalidation import on_commit
+from app.models import SystemConfig
+
+SYNC_KEYS = ('player_refresh_token', 'player_command', 'player_command_time')
+
+
+class PlayerSync:
+    """Versioned snapshot of SYNC_KEYS shared by all player connections."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._values = None
+        # Start from the clock so versions keep increasing across restarts
+        self._version = int(time.time() * 1000)
+
+    def _load(self):
+        configs = SystemConfig.query.filter(SystemConfig.key.in_(SYNC_KEYS)).all()
+        values = {c.key: c.value for c in configs}
+        with self._condition:
+            if self._values is None:
+                self._values = values
+                self._version += 1
+
+    def snapshot(self):
+        """Current state as sent to players (loads it on first use)."""
+        if self._values is None:
+            self._load()
+        with self._condition:
+            return self._state()
+
+    def _state(self):
+        return {
+            'version': self._version,
+            'refresh_token': self._values.get('player_refresh_token'),
+            'command': self._values.get('player_command'),
+            'command_time': self._values.get('player_command_time')
+        }
+
+    def publish(self, values):
+        """Record committed key values and wake every waiter."""
+        with self._condition:
+            # Not loaded yet: the next snapshot() reads the committed rows.
+            if self._values is not None:
+                self._values.update(values)
+                self._version += 1
+                self._condition.notify_all()
+
+    def wait(self, since, timeout):
+        """Block until the version differs from ``since`` or ``timeout`` expires.
+
+        Must follow a snapshot() call so no database access happens here.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._version != since, timeout)
+            return self._state()
+
+
+player_sync = PlayerSync()
+
+
+@on_commit(SystemConfig, snapshot=lambda config: (config.key, config.value))
+def _publish_player_keys(changes):
+    values = {}
+    for op, model, change in changes:
+        if change and change[0] in SYNC_KEYS:
+            key, value = change
+            values[key] = value if op != 'delete' else None
+    if values:
+        player_sync.publish(values)
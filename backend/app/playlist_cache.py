@@ -0,0 +1,183 @@
+"""Compiled, in-memory copies of playlists as the player sees them.
+
+A compiled playlist holds the ordered player payload of every active item
+together with its per-item schedule rules, so resolving what is visible at a
+given moment needs no PlaylistAsset/Asset query. The cache is dropped after
+any commit touching playlists, playlist items or assets.
+"""
+import threading
+from datetime import datetime, time, timedelta
+
+from sqlalchemy.orm import joinedload
+
+from app.invalidation import on_commit
+from app.models import Playlist, PlaylistAsset, Asset
+
+
+class CompiledItem:
+    """Player payload of one playlist entry plus its visibility rules."""
+
+    __slots__ = ('payload', 'media', 'start_minute', 'end_minute', 'days_mask', 'start_date', 'end_date')
+
+    def __init__(self, pa):
+        asset = pa.asset
+        self.payload = {
+            'id': pa.id,
+            'asset_id': asset.id,
+            'type': asset.type,
+            'name': asset.name,
+            'path': asset.path,
+            'duration': pa.custom_duration if pa.custom_duration else asset.duration,
+            'position': pa.position,
+            'url': f"/api/assets/{asset.id}/file" if asset.type != 'url' else asset.path
+        }
+        # What a screen needs to prefetch and cache the file
+        self.media = {
+            'size': asset.file_size,
+            'content_hash': asset.content_hash,
+            'mime_type': asset.mime_type
+        }
+        self.start_minute = pa.schedule_start_minute
+        self.end_minute = pa.schedule_end_minute
+        self.days_mask = pa.schedule_days_mask
+        self.start_date = pa.schedule_start_date
+        self.end_date = pa.schedule_end_date
+
+    @property
+    def has_rules(self):
+        return any(rule is not None for rule in (
+            self.start_minute, self.end_minute, self.days_mask, self.start_date, self.end_date
+        ))
+
+    def is_visible(self, now):
+        """Apply the per-item schedule (if any) at ``now``.
+
+        Mirrors PlaylistAsset.visible_at, which does the same in SQL.
+        """
+        current_date = now.date()
+        minute = now.hour * 60 + now.minute
+        start, end = self.start_minute, self.end_minute
+
+        # Check date range first
+        if self.start_date and current_date < self.start_date:
+            return False
+        if self.end_date and current_date > self.end_date:
+            return False
+
+        # Check day of week
+        if self.days_mask and not self.days_mask & (1 << now.weekday()):
+            return False
+
+        # Check time range; the end minute is exclusive, as for schedules
+        if start is not None and end is not None:
+            if start <= end:
+                # Normal range (e.g., 09:00-18:00)
+                return start <= minute < end
+            # Overnight range (e.g., 22:00-06:00)
+            return minute >= start or minute < end
+        if start is not None:
+            return minute >= start
+        if end is not None:
+            return minute < end
+        return True
+
+
+class CompiledPlaylist:
+    """A playlist's metadata and its active items in play order."""
+
+    def __init__(self, playlist, items):
+        self.id = playlist.id
+        self.name = playlist.name
+        self.items = items
+        self.has_rules = any(item.has_rules for item in items)
+        self.change_minutes = sorted(
+            {m for item in items for m in (item.start_minute, item.end_minute) if m is not None}
+        )
+
+    def visible_items(self, now):
+        return [item.payload for item in self.items if item.is_visible(now)]
+
+    def upcoming_items(self, now, after_position, count):
+        """Up to ``count`` visible items following ``after_position``, wrapping
+        around to the start of the playlist (each item at most once)."""
+        visible = [item for item in self.items if item.is_visible(now)]
+        split = next((i for i, item in enumerate(visible)
+                      if item.payload['position'] > after_position), len(visible))
+        ordered = visible[split:] + visible[:split]
+        return [dict(item.payload, **item.media) for item in ordered[:count]]
+
+    def next_change(self, when):
+        """First moment after ``when`` where the visible items may change.
+
+        None when no item has a schedule, i.e. the set never changes on its own.
+        """
+        if not self.has_rules:
+            return None
+        midnight = datetime.combine(when.date(), time())
+        minute = when.hour * 60 + when.minute
+        for change_minute in self.change_minutes:
+            if change_minute > minute:
+                return midnight + timedelta(minutes=change_minute)
+        # Days of week and date ranges only flip at midnight
+        return midnight + timedelta(days=1)
+
+
+class PlaylistCache:
+    """Process-wide cache of compiled playlists keyed by id."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._playlists = {}
+        self._fallback_id = None
+        self._generation = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._playlists = {}
+            self._fallback_id = None
+
+    def get(self, playlist_id):
+        """CompiledPlaylist for ``playlist_id``, or None if it does not exist."""
+        if playlist_id in self._playlists:
+            return self._playlists[playlist_id]
+
+        generation = self._generation
+        compiled = None
+        playlist = Playlist.query.get(playlist_id)
+        if playlist:
+            playlist_assets = PlaylistAsset.query.filter_by(playlist_id=playlist.id)\
+                .options(joinedload(PlaylistAsset.asset))\
+                .order_by(PlaylistAsset.position).all()
+            compiled = CompiledPlaylist(playlist, [
+                CompiledItem(pa) for pa in playlist_assets if pa.asset and pa.asset.is_active
+            ])
+
+        with self._lock:
+            # A commit may have landed while compiling; don't keep stale data.
+            if generation == self._generation:
+                self._playlists[playlist_id] = compiled
+        return compiled
+
+    def fallback(self):
+        """Default active playlist, else the first active one, else None."""
+        if self._fallback_id is None:
+            generation = self._generation
+            playlist = Playlist.query.filter_by(is_default=True, is_active=True).first()
+            if not playlist:
+                playlist = Playlist.query.filter_by(is_active=True).first()
+            with self._lock:
+                if generation == self._generation:
+                    self._fallback_id = playlist.id if playlist else 0
+            if not playlist:
+                return None
+            return self.get(playlist.id)
+        return self.get(self._fallback_id) if self._fallback_id else None
+
+
+playlist_cache = PlaylistCache()
+
+
+@on_commit(Playlist, PlaylistAsset, Asset)
+def _invalidate_playlists(changes):
+    playlist_cache.invalidate()
@@ -0,0 +1,110 @@
+"""Keeps Playlist.asset_count and total_duration in step with the items.
+
+Playlists touched by a flush (items added, removed, moved to another
+playlist or given another custom duration, assets whose duration changed)
+have both columns recomputed from their items in the same transaction, so
+listings read them without joins or aggregates. reconcile() checks every
+playlist and repairs any drift, e.g. after edits made outside the app.
+"""
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Asset, Playlist, PlaylistAsset, playlist_stats
+
+# Changing these moves time or items between playlists
+ITEM_FIELDS = ('playlist_id', 'asset_id', 'custom_duration')
+ASSET_FIELDS = ('duration',)
+
+def recount(connection, playlist_ids=None):
+    """Recompute the totals of ``playlist_ids`` (every playlist when None) in SQL."""
+    playlists = Playlist.__table__
+    items = PlaylistAsset.__table__
+    assets = Asset.__table__
+    duration = func.coalesce(func.nullif(items.c.custom_duration, 0), assets.c.duration, 0)
+    count = select(func.count(items.c.id))\
+        .where(items.c.playlist_id == playlists.c.id).scalar_subquery()
+    total = select(func.coalesce(func.sum(duration), 0))\
+        .select_from(items.outerjoin(assets, assets.c.id == items.c.asset_id))\
+        .where(items.c.playlist_id == playlists.c.id).scalar_subquery()
+    # updated_at is about the playlist's own fields; keep it as is
+    stmt = update(playlists).values(asset_count=count, total_duration=total,
+                                    updated_at=playlists.c.updated_at)
+    if playlist_ids is not None:
+        stmt = stmt.where(playlists.c.id.in_(playlist_ids))
+    connection.execute(stmt)
+
+
+def reconcile():
+    """Fix playlists whose stored totals differ from their items; returns their ids."""
+    stats = playlist_stats()
+    drifted = [
+        playlist_id for playlist_id, count, total in
+        db.session.query(Playlist.id, Playlist.asset_count, Playlist.total_duration)
+        if (count, total) != stats.get(playlist_id, (0, 0))
+    ]
+    if drifted:
+        recount(db.session.connection(), drifted)
+        db.session.commit()
+    return drifted
+
+
+def _changed(obj, fields):
+    """Whether any of ``fields`` changed in the flush; also the previous playlist_id values."""
+    state = db.inspect(obj)
+    changed = any(state.attrs[field].history.has_changes() for field in fields)
+    previous = state.attrs.playlist_id.history.deleted if 'playlist_id' in fields else ()
+    return changed, previous
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_playlists(session, flush_context):
+    # new/dirty/deleted still describe what was just flushed, with ids assigned
+    touched = set()
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, PlaylistAsset):
+            touched.add(obj.playlist_id)
+    changed_assets = []
+    for obj in session.dirty:
+        if isinstance(obj, PlaylistAsset):
+            changed, previous = _changed(obj, ITEM_FIELDS)
+            if changed:
+                touched.add(obj.playlist_id)
+                touched.update(previous)
+        elif isinstance(obj, Asset) and _changed(obj, ASSET_FIELDS)[0]:
+            changed_assets.append(obj.id)
+    if changed_assets:
+        touched.update(playlist_id for (playlist_id,) in session.connection().execute(
+            select(PlaylistAsset.playlist_id).distinct().where(PlaylistAsset.asset_id.in_(changed_assets))
+        ))
+    touched.discard(None)
+    if touched:
+        session.info.setdefault('playlists_to_recount', set()).update(touched)
+
+
+# Query.update()/delete() run outside the flush: recount everything right away
+
+@event.listens_for(Session, 'after_bulk_update')
+def _recount_after_bulk_update(update_context):
+    if update_context.mapper.class_ in (PlaylistAsset, Asset):
+        keys = {getattr(key, 'key', key) for key in update_context.values}
+        if keys & set(ITEM_FIELDS + ASSET_FIELDS):
+            recount(update_context.session.connection())
+
+
+@event.listens_for(Session, 'after_bulk_delete')
+def _recount_after_bulk_delete(delete_context):
+    if delete_context.mapper.class_ in (PlaylistAsset, Asset):
+        recount(delete_context.session.connection())
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _recount_playlists(session, flush_context):
+    touched = session.info.pop('playlists_to_recount', None)
+    if not touched:
+        return
+    recount(session.connection(), touched)
+    # Loaded playlists would otherwise show the totals from before the flush
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Playlist) and obj.id in touched:
+            session.expire(obj, ['asset_count', 'total_duration'])
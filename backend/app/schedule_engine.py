@@ -0,0 +1,179 @@
+"""Compiled weekly schedule timeline.
+
+Active schedules are compiled once into sorted, non-overlapping intervals keyed
+by minute-of-week, with priorities and date ranges already resolved. Finding the
+schedule that plays at a given moment is then a single binary search. The
+timeline is rebuilt only after a commit that touches a Schedule (or deletes a
+Playlist, which cascades to its schedules) and when the week rolls over.
+"""
+import threading
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from app import db
+from app.invalidation import on_commit
+from app.models import Schedule, Playlist, mask_to_days
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# What the timeline knows about a compiled schedule; ``version`` changes
+# whenever the row is edited, so it can be folded into content hashes.
+ActiveSchedule = namedtuple('ActiveSchedule', ['id', 'playlist_id', 'version'])
+
+
+def minute_of_day(value):
+    """Minutes since midnight for a time or datetime."""
+    return value.hour * 60 + value.minute
+
+
+def week_start_of(when):
+    """Date of the Monday starting the week that contains ``when``."""
+    return when.date() - timedelta(days=when.weekday())
+
+
+class ScheduleTimeline:
+    """Priority-resolved schedule intervals for one calendar week."""
+
+    def __init__(self, week_start, starts, intervals, schedules):
+        self.week_start = week_start
+        # starts[i] is the first minute-of-week of interval i (sorted), and
+        # intervals[i] is its (end_minute, schedule_id); ends are exclusive.
+        self.starts = starts
+        self.intervals = intervals
+        self.schedules = schedules
+        self.boundaries = sorted(set(starts) | {end for end, _ in intervals})
+
+    def minute_of_week(self, when):
+        return (when.date() - self.week_start).days * MINUTES_PER_DAY + minute_of_day(when)
+
+    def schedule_id_at(self, when):
+        """Id of the schedule active at ``when``, or None."""
+        minute = self.minute_of_week(when)
+        index = bisect_right(self.starts, minute) - 1
+        if index >= 0:
+            end, schedule_id = self.intervals[index]
+            if minute < end:
+                return schedule_id
+        return None
+
+    def schedule_at(self, when):
+        """ActiveSchedule playing at ``when``, or None."""
+        schedule_id = self.schedule_id_at(when)
+        return self.schedules[schedule_id] if schedule_id is not None else None
+
+    def next_change(self, when):
+        """First moment after ``when`` where the active schedule may change.
+
+        Falls back to the start of the following week, where the next
+        week's timeline takes over.
+        """
+        index = bisect_right(self.boundaries, self.minute_of_week(when))
+        week_start = datetime.combine(self.week_start, time())
+        if index < len(self.boundaries):
+            return week_start + timedelta(minutes=self.boundaries[index])
+        return week_start + timedelta(minutes=MINUTES_PER_WEEK)
+
+
+def compile_timeline(schedules, week_start):
+    """Compile schedules into a ScheduleTimeline for the week at ``week_start``.
+
+    Each listed day is evaluated on its own, as the per-request loop did: an
+    overnight schedule (start after end) covers both the early morning and the
+    late evening of every day it is enabled on.
+    """
+    spans = []
+    infos = {}
+    for schedule in schedules:
+        infos[schedule.id] = ActiveSchedule(
+            schedule.id, schedule.playlist_id,
+            schedule.updated_at.isoformat() if schedule.updated_at else None
+        )
+        days = mask_to_days(schedule.days_mask)
+        start, end = schedule.start_minute, schedule.end_minute
+        windows = [(start, end)] if start <= end else [(0, end), (start, MINUTES_PER_DAY)]
+        # Higher priority wins; on a tie the oldest schedule wins.
+        rank = (schedule.priority or 0, -schedule.id)
+
+        for day in days:
+            date = week_start + timedelta(days=day)
+            if schedule.start_date and date < schedule.start_date:
+                continue
+            if schedule.end_date and date > schedule.end_date:
+                continue
+            base = day * MINUTES_PER_DAY
+            for lo, hi in windows:
+                if lo < hi:
+                    spans.append((base + lo, base + hi, rank, schedule.id))
+
+    bounds = sorted({minute for lo, hi, _, _ in spans for minute in (lo, hi)})
+    starts, intervals = [], []
+    for lo, hi in zip(bounds, bounds[1:]):
+        covering = [(rank, schedule_id) for a, b, rank, schedule_id in spans if a <= lo and hi <= b]
+        if not covering:
+            continue
+        winner = max(covering)[1]
+        if intervals and intervals[-1] == (lo, winner):
+            intervals[-1] = (hi, winner)
+        else:
+            starts.append(lo)
+            intervals.append((hi, winner))
+
+    return ScheduleTimeline(week_start, starts, intervals, infos)
+
+
+class ScheduleEngine:
+    """Process-wide cache of compiled timelines (this week and the next)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timelines = {}
+        self._generation = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._timelines = {}
+
+    def timeline(self, when):
+        week_start = week_start_of(when)
+        timeline = self._timelines.get(week_start)
+        if timeline is not None:
+            return timeline
+
+        with self._lock:
+            timeline = self._timelines.get(week_start)
+            if timeline is None:
+                generation = self._generation
+                schedules = Schedule.query.filter(Schedule.is_active == True).all()
+                timeline = compile_timeline(schedules, week_start)
+                # A commit may have landed while compiling; don't keep stale data.
+                if generation == self._generation:
+                    timelines = {**self._timelines, week_start: timeline}
+                    self._timelines = dict(sorted(timelines.items())[-2:])
+        return timeline
+
+    def resolve(self, when):
+        """ActiveSchedule playing at ``when``, or None; never queries once compiled."""
+        return self.timeline(when).schedule_at(when)
+
+    def next_change(self, when):
+        """First moment after ``when`` where the active schedule may change."""
+        return self.timeline(when).next_change(when)
+
+    def active_schedule(self, when):
+        """Schedule model active at ``when``, or None."""
+        active = self.resolve(when)
+        if active is None:
+            return None
+        return db.session.get(Schedule, active.id)
+
+
+schedule_engine = ScheduleEngine()
+
+
+@on_commit(Schedule, Playlist)
+def _invalidate_timeline(changes):
+    if any(model is Schedule or op == 'delete' for op, model, _ in changes):
+        schedule_engine.invalidate()
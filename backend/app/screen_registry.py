@@ -0,0 +1,140 @@
+"""In-memory registry of screens, fed by player heartbeats.
+
+Heartbeats only update memory. Screens that changed since the last flush are
+written to the screens table in one batched upsert every
+SCREEN_FLUSH_INTERVAL seconds (and at shutdown), so a fleet of screens
+pinging every few seconds costs one commit per interval, not one per ping.
+
+Only the SCREEN_REGISTRY_SIZE most recently seen screens are kept in memory;
+older ones stay in the table.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models import Screen
+
+FIELDS = [column.name for column in Screen.__table__.columns]
+
+
+class ScreenRegistry:
+    """Latest known state of every screen, keyed by screen id."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._screens = None
+        self._dirty = set()
+
+    def _ensure_loaded(self):
+        if self._screens is None:
+            screens = Screen.query.order_by(Screen.last_heartbeat.desc())\
+                .limit(current_app.config['SCREEN_REGISTRY_SIZE']).all()
+            rows = {s.id: {f: getattr(s, f) for f in FIELDS} for s in screens}
+            with self._lock:
+                if self._screens is None:
+                    self._screens = rows
+
+    def heartbeat(self, screen_id, values):
+        """Record a heartbeat; ``values`` holds Screen column values."""
+        self._ensure_loaded()
+        now = datetime.utcnow()
+        with self._lock:
+            row = self._screens.get(screen_id)
+            if row is None:
+                self._evict(current_app.config['SCREEN_REGISTRY_SIZE'] - 1)
+                row = dict.fromkeys(FIELDS)
+                row.update(id=screen_id, created_at=now)
+                self._screens[screen_id] = row
+            row.update(values, last_heartbeat=now)
+            self._dirty.add(screen_id)
+            return dict(row)
+
+    def _evict(self, size):
+        """Forget the least recently seen screens already saved, down to ``size``."""
+        excess = len(self._screens) - size
+        if excess <= 0:
+            return
+        saved = [row for screen_id, row in self._screens.items() if screen_id not in self._dirty]
+        saved.sort(key=lambda row: row['last_heartbeat'] or datetime.min)
+        for row in saved[:excess]:
+            del self._screens[row['id']]
+
+    def get(self, screen_id):
+        """Row dict for one screen, or None."""
+        self._ensure_loaded()
+        with self._lock:
+            row = self._screens.get(screen_id)
+            return dict(row) if row else None
+
+    def fleet(self, offline_after):
+        """Every known screen as dicts, flagged online if seen recently."""
+        self._ensure_loaded()
+        cutoff = datetime.utcnow() - timedelta(seconds=offline_after)
+        with self._lock:
+            rows = [dict(row) for row in self._screens.values()]
+
+        screens = []
+        for row in sorted(rows, key=lambda r: r['id']):
+            data = Screen(**row).to_dict()
+            data['online'] = bool(row['last_heartbeat'] and row['last_heartbeat'] >= cutoff)
+            screens.append(data)
+        return screens
+
+    def flush(self):
+        """Upsert screens changed since the last flush in one statement.
+        
+        If the database is busy the screens are kept for the next flush. If
+        the batch fails otherwise, each row is written on its own and the
+        ones that still fail are dropped until their next heartbeat.
+        """
+        with self._lock:
+            if not self._dirty:
+                return 0
+            rows = [dict(self._screens[screen_id]) for screen_id in self._dirty]
+            self._dirty = set()
+
+        stmt = insert(Screen.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['id'],
+            set_={f: stmt.excluded[f] for f in FIELDS if f not in ('id', 'created_at')}
+        )
+        try:
+            db.session.execute(stmt, rows)
+            db.session.commit()
+            return len(rows)
+        except OperationalError as e:
+            db.session.rollback()
+            print(f"Error saving screens, retrying on the next flush: {e}")
+            self._requeue(rows)
+            return 0
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error saving screens, retrying one by one: {e}")
+        
+        # One bad row must not keep every other screen from being saved
+        saved = 0
+        for row in rows:
+            try:
+                db.session.execute(stmt, row)
+                db.session.commit()
+                saved += 1
+            except OperationalError as e:
+                db.session.rollback()
+                print(f"Error saving screen {row['id']}, retrying on the next flush: {e}")
+                self._requeue([row])
+            except Exception as e:
+                db.session.rollback()
+                print(f"Dropping status of screen {row['id']}: {e}")
+        return saved
+
+    def _requeue(self, rows):
+        with self._lock:
+            # Their latest state is still in memory: the next flush writes that
+            self._dirty.update(row['id'] for row in rows if row['id'] in self._screens)
+
+
+screen_registry = ScreenRegistry()
@@ -0,0 +1,140 @@
+"""Thumbnail sprite sheets for the asset grid.
+
+Instead of one request per tile, the dashboard asks for a sheet covering a
+page of assets: a single JPEG of equally sized 16:9 tiles plus the tile index
+of each asset. Sheets are named after a hash of the thumbnails they contain,
+so they are served from /media as immutable files; the manifest for a list of
+ids is kept in memory and dropped after any commit touching assets.
+"""
+import hashlib
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from PIL import Image, ImageOps
+
+from app.background import in_os_thread
+from app.invalidation import on_commit
+from app.media_store import media_path
+from app.models import Asset
+
+TILE_SIZE = (320, 180)
+COLUMNS = 10
+MAX_TILES = 200
+QUALITY = 80
+# Manifests kept in memory, least recently used dropped first
+MAX_MANIFESTS = 64
+
+
+def build_sheet(relpath, thumbnail_paths):
+    """Draw the thumbnails, cropped to fill a tile each, into one JPEG.
+
+    Raises if a thumbnail cannot be read; nothing is written then, since the
+    sheet's name promises every tile.
+    """
+    columns = min(len(thumbnail_paths), COLUMNS)
+    rows = math.ceil(len(thumbnail_paths) / columns)
+    width, height = TILE_SIZE
+    sheet = Image.new('RGB', (columns * width, rows * height), (32, 32, 32))
+    for index, thumbnail_path in enumerate(thumbnail_paths):
+        with Image.open(media_path(thumbnail_path)) as thumb:
+            tile = ImageOps.fit(thumb.convert('RGB'), TILE_SIZE)
+        sheet.paste(tile, ((index % columns) * width, (index // columns) * height))
+
+    # Two requests may build the same sheet at once: each writes its own temp file
+    fd, tmp_path = tempfile.mkstemp(prefix='.sprite-', dir=media_path('sprites'))
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            sheet.save(out, 'JPEG', quality=QUALITY, optimize=True)
+        os.replace(tmp_path, media_path(relpath))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class SpriteCache:
+    """Process-wide cache of sprite manifests keyed by the requested ids
+    (the MAX_MANIFESTS most recently used)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._manifests = OrderedDict()
+        self._generation = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._manifests = OrderedDict()
+
+    def get(self, asset_ids):
+        """Manifest for a sheet of the given assets' thumbnails (in that order).
+
+        Assets without a thumbnail are left out; ``sprite`` is None when
+        none of them has one, or when a thumbnail file cannot be read (that
+        manifest is not cached, so the next request tries again).
+        """
+        asset_ids = tuple(asset_ids[:MAX_TILES])
+        with self._lock:
+            manifest = self._manifests.get(asset_ids)
+            if manifest is not None:
+                self._manifests.move_to_end(asset_ids)
+                return manifest
+
+        generation = self._generation
+        rows = Asset.query.with_entities(Asset.id, Asset.thumbnail_path)\
+            .filter(Asset.id.in_(asset_ids), Asset.thumbnail_path.isnot(None)).all()
+        thumbnails = dict(rows)
+        ids = [asset_id for asset_id in asset_ids if asset_id in thumbnails]
+        paths = [thumbnails[asset_id] for asset_id in ids]
+
+        manifest = {'sprite': None, 'items': {}}
+        if ids:
+            # Same thumbnails in the same order, same file
+            digest = hashlib.sha256('\n'.join(paths).encode('utf-8')).hexdigest()
+            relpath = f"sprites/{digest}.jpg"
+            if not os.path.exists(media_path(relpath)):
+                try:
+                    in_os_thread(build_sheet, relpath, paths)
+                except Exception:
+                    current_app.logger.exception('Building sprite sheet %s failed', relpath)
+                    return manifest
+            columns = min(len(ids), COLUMNS)
+            manifest = {
+                'sprite': f"/media/{relpath}",
+                'columns': columns,
+                'rows': math.ceil(len(ids) / columns),
+                'tile': {'width': TILE_SIZE[0], 'height': TILE_SIZE[1]},
+                'items': {asset_id: index for index, asset_id in enumerate(ids)}
+            }
+
+        with self._lock:
+            # A commit may have landed while building; don't keep stale data.
+            if generation == self._generation:
+                self._manifests[asset_ids] = manifest
+                while len(self._manifests) > MAX_MANIFESTS:
+                    self._manifests.popitem(last=False)
+        return manifest
+
+    def prune(self, max_age):
+        """Delete sheet files older than ``max_age`` seconds that no cached manifest uses."""
+        with self._lock:
+            manifests = list(self._manifests.values())
+        in_use = {m['sprite'].rsplit('/', 1)[1] for m in manifests if m['sprite']}
+        cutoff = time.time() - max_age
+        folder = media_path('sprites')
+        for filename in os.listdir(folder):
+            filepath = os.path.join(folder, filename)
+            if filename not in in_use and os.path.getmtime(filepath) < cutoff:
+                os.remove(filepath)
+
+
+sprite_cache = SpriteCache()
+
+
+@on_commit(Asset)
+def _invalidate_sprites(changes):
+    sprite_cache.invalidate()
@@ -0,0 +1,141 @@
+"""One transaction per unit of work: a write request, or a whole batch.
+
+Route handlers commit as they go. Inside a unit of work those commits only
+flush (ids are assigned and constraints checked) and everything is
+committed once at the end, or rolled back if anything fails. On SQLite
+that is a single fsync per request instead of one per commit.
+
+Every POST/PUT/PATCH/DELETE request is a unit of work (see init_app()).
+It commits if the handler asked to commit and the response is not a
+server error. Work that belongs at the end of the transaction goes through
+before_commit() (e.g. bumping the player refresh token, once) and
+after_commit() (e.g. deleting files, which cannot be rolled back); undoing
+file moves on failure goes through after_rollback().
+"""
+from contextlib import contextmanager
+
+from flask import request
+
+from app import db
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+STATE_KEYS = ('defer_commits', 'commit_requested', 'rollback_only', 'before_commit', 'after_commit',
+              'after_rollback')
+
+
+def deferred():
+    """Whether commits are currently deferred to an enclosing unit of work."""
+    return bool(db.session.info.get('defer_commits'))
+
+
+def _queue(name, fn):
+    queue = db.session.info.setdefault(name, [])
+    if fn not in queue:
+        queue.append(fn)
+
+
+def before_commit(fn):
+    """Call ``fn()`` right before the unit of work commits, or now outside of one.
+
+    The same callable queued twice runs once; nothing runs after a rollback.
+    """
+    if deferred():
+        _queue('before_commit', fn)
+    else:
+        fn()
+
+
+def after_commit(fn):
+    """Call ``fn()`` once the unit of work has committed, or now outside of one.
+
+    The same callable queued twice runs once; nothing runs after a rollback.
+    """
+    if deferred():
+        _queue('after_commit', fn)
+    else:
+        fn()
+
+
+def after_rollback(fn):
+    """Call ``fn()`` if the unit of work is rolled back instead of committed.
+
+    Outside of one there is nothing left to roll back, so ``fn`` is dropped.
+    """
+    if deferred():
+        _queue('after_rollback', fn)
+
+
+def begin():
+    """Start deferring commits; False if a unit of work is already open (it will commit)."""
+    if deferred():
+        return False
+    db.session.info['defer_commits'] = True
+    return True
+
+
+def finish(commit=True):
+    """End the unit of work started by begin(): commit everything, or roll it all back."""
+    info = db.session.info
+    commit = commit and not info.get('rollback_only')
+    try:
+        if commit:
+            # Still deferred: commits made by these only flush
+            for fn in info.get('before_commit', []):
+                fn()
+            del info['defer_commits']
+            db.session.commit()
+    except BaseException:
+        commit = False
+        raise
+    finally:
+        callbacks = info.get('after_commit' if commit else 'after_rollback', [])
+        for key in STATE_KEYS:
+            info.pop(key, None)
+        if not commit:
+            db.session.rollback()
+    for fn in callbacks:
+        fn()
+
+
+@contextmanager
+def unit_of_work():
+    """Commit everything done in the block at once, or nothing if it raises.
+
+    Nested in another unit of work, an error dooms the outer one instead.
+    """
+    if not begin():
+        try:
+            yield
+        except BaseException:
+            db.session.info['rollback_only'] = True
+            raise
+        return
+    try:
+        yield
+    except BaseException:
+        finish(commit=False)
+        raise
+    finish()
+
+
+def init_app(app):
+    """Make every write request a unit of work."""
+
+    @app.before_request
+    def _begin_request():
+        if request.method in WRITE_METHODS:
+            # Requests dispatched from a batch join the batch's unit of work
+            request.environ['screensplash.unit_of_work'] = begin()
+
+    @app.after_request
+    def _finish_request(response):
+        if request.environ.pop('screensplash.unit_of_work', False):
+            # Without a commit() call the handler meant to keep nothing
+            finish(commit=response.status_code < 500 and db.session.info.get('commit_requested', False))
+        return response
+
+    @app.teardown_request
+    def _abandon_request(exc):
+        # after_request did not run (e.g. it failed itself)
+        if request.environ.pop('screensplash.unit_of_work', False):
+            finish(commit=False)
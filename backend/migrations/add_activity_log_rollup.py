@@ -0,0 +1,52 @@
+"""
+Migration script to add the activity log indexes and the per-day, per-action
+counts table (activity_log_daily), filled from the existing entries
+"""
+import sqlite3
+import os
+
+# Find the database - it's in the project root, not backend folder
+db_path = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'screensplash.db')
+db_path = os.path.abspath(db_path)
+
+print(f"Database path: {db_path}")
+
+if not os.path.exists(db_path):
+    print("Database not found!")
+    exit(1)
+
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+print("Creating index: ix_activity_logs_entity_type_created_at")
+cursor.execute("CREATE INDEX IF NOT EXISTS ix_activity_logs_entity_type_created_at ON activity_logs (entity_type, created_at)")
+print("Creating index: ix_activity_logs_created_at")
+cursor.execute("CREATE INDEX IF NOT EXISTS ix_activity_logs_created_at ON activity_logs (created_at)")
+
+print("Creating table: activity_log_daily")
+cursor.execute("""
+    CREATE TABLE IF NOT EXISTS activity_log_daily (
+        day DATE NOT NULL,
+        action VARCHAR(100) NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, action)
+    )
+""")
+
+cursor.execute("SELECT COUNT(*) FROM activity_log_daily")
+if cursor.fetchone()[0] == 0:
+    print("Filling activity_log_daily from activity_logs")
+    cursor.execute("""
+        INSERT INTO activity_log_daily (day, action, count)
+        SELECT date(created_at), action, COUNT(*) FROM activity_logs
+        WHERE created_at IS NOT NULL
+        GROUP BY date(created_at), action
+    """)
+    print(f"  {cursor.rowcount} day/action rows")
+else:
+    print("  Already filled, skipping")
+
+conn.commit()
+conn.close()
+
+print("Migration complete!")
@@ -0,0 +1,58 @@
+"""
+Migration script to add the content_hash column to assets and backfill it
+by hashing the files already on disk
+"""
+import hashlib
+import sqlite3
+import os
+
+# Find the database - it's in the project root, not backend folder
+db_path = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'screensplash.db')
+db_path = os.path.abspath(db_path)
+upload_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'assets'))
+
+print(f"Database path: {db_path}")
+
+if not os.path.exists(db_path):
+    print("Database not found!")
+    exit(1)
+
+
+def hash_file(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+cursor.execute("PRAGMA table_info(assets)")
+existing_columns = [row[1] for row in cursor.fetchall()]
+
+if 'content_hash' not in existing_columns:
+    print("Adding column: content_hash")
+    cursor.execute("ALTER TABLE assets ADD COLUMN content_hash VARCHAR(64)")
+else:
+    print("Column already exists: content_hash")
+
+cursor.execute("CREATE INDEX IF NOT EXISTS ix_assets_content_hash ON assets (content_hash)")
+
+# Backfill hashes for file assets
+cursor.execute("SELECT id, path FROM assets WHERE content_hash IS NULL AND type IN ('image', 'video')")
+hashed = 0
+for asset_id, path in cursor.fetchall():
+    filepath = os.path.join(upload_folder, path)
+    if not os.path.exists(filepath):
+        print(f"Missing file for asset {asset_id}: {path}")
+        continue
+    cursor.execute("UPDATE assets SET content_hash = ? WHERE id = ?", (hash_file(filepath), asset_id))
+    hashed += 1
+print(f"Hashed {hashed} assets")
+
+conn.commit()
+conn.close()
+
+print("Migration complete!")
@@ -0,0 +1,29 @@
+"""
+Migration script to add the indexes used by keyset pagination of the asset
+listing
+"""
+import sqlite3
+import os
+
+# Find the database - it's in the project root, not backend folder
+db_path = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'screensplash.db')
+db_path = os.path.abspath(db_path)
+
+print(f"Database path: {db_path}")
+
+if not os.path.exists(db_path):
+    print("Database not found!")
+    exit(1)
+
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+print("Creating index: ix_assets_created_at_id")
+cursor.execute("CREATE INDEX IF NOT EXISTS ix_assets_created_at_id ON assets (created_at, id)")
+print("Creating index: ix_assets_type_created_at_id")
+cursor.execute("CREATE INDEX IF NOT EXISTS ix_assets_type_created_at_id ON assets (type, created_at, id)")
+
+conn.commit()
+conn.close()
+
+print("Migration complete!")
@@ -0,0 +1,74 @@
+"""
+Migration script to add codec, bitrate and frame_rate columns to assets and
+queue metadata extraction for the files already uploaded
+"""
+import sqlite3
+import os
+
+# Find the database - it's in the project root, not backend folder
+db_path = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'screensplash.db')
+db_path = os.path.abspath(db_path)
+
+print(f"Database path: {db_path}")
+
+if not os.path.exists(db_path):
+    print("Database not found!")
+    exit(1)
+
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+cursor.execute("PRAGMA table_info(assets)")
+existing_columns = [row[1] for row in cursor.fetchall()]
+
+new_columns = [
+    ('codec', 'VARCHAR(50)'),
+    ('bitrate', 'INTEGER'),
+    ('frame_rate', 'FLOAT'),
+]
+
+added_codec = 'codec' not in existing_columns
+
+for col_name, col_type in new_columns:
+    if col_name not in existing_columns:
+        print(f"Adding column: {col_name}")
+        cursor.execute(f"ALTER TABLE assets ADD COLUMN {col_name} {col_type}")
+    else:
+        print(f"Column already exists: {col_name}")
+
+# Normally created by the app on its first start, but an install updating
+# straight from before the job queue runs this first
+cursor.execute("""
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER NOT NULL,
+        kind VARCHAR(50) NOT NULL,
+        asset_id INTEGER,
+        payload TEXT,
+        status VARCHAR(20) NOT NULL,
+        attempts INTEGER NOT NULL,
+        error TEXT,
+        created_at DATETIME,
+        started_at DATETIME,
+        finished_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(asset_id) REFERENCES assets (id) ON DELETE CASCADE
+    )
+""")
+cursor.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status_id ON jobs (status, id)")
+cursor.execute("CREATE INDEX IF NOT EXISTS ix_jobs_asset_id ON jobs (asset_id)")
+
+# Backfill only on the run that adds the columns: images never get a codec,
+# and their finished jobs are pruned, so later updates would queue them again
+if added_codec:
+    cursor.execute("""
+        INSERT INTO jobs (kind, asset_id, status, attempts, created_at)
+        SELECT 'process_asset', id, 'pending', 0, datetime('now') FROM assets
+        WHERE type IN ('image', 'video') AND codec IS NULL
+          AND NOT EXISTS (SELECT 1 FROM jobs WHERE jobs.asset_id = assets.id AND jobs.kind = 'process_asset')
+    """)
+    print(f"Queued metadata extraction for {cursor.rowcount} assets")
+
+conn.commit()
+conn.close()
+
+print("Migration complete!")
@@ -0,0 +1,33 @@
+"""
+Migration script to add the processing status column to assets
+"""
+import sqlite3
+import os
+
+# Find the database - it's in the project root, not backend folder
+db_path = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'screensplash.db')
+db_path = os.path.abspath(db_path)
+
+print(f"Database path: {db_path}")
+
+if not os.path.exists(db_path):
+    print("Database not found!")
+    exit(1)
+
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+cursor.execute("PRAGMA table_info(assets)")
+existing_columns = [row[1] for row in cursor.fetchall()]
+
+if 'status' not in existing_columns:
+    print("Adding column: status")
+    # Existing assets were fully processed at upload time
+    cursor.execute("ALTER TABLE assets ADD COLUMN status VARCHAR(20) NOT NULL DEFAULT 'ready'")
+else:
+    print("Column already exists: status")
+
+conn.commit()
+conn.close()
+
+print("Migration complete!")
@@ -0,0 +1,47 @@
+"""
+Migration script to add the status column to asset_variants (renditions are
+now listed while they are being encoded)
+"""
+import sqlite3
+import os
+
+# Find the database - it's in the project root, not backend folder
+db_path = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'screensplash.db')
+db_path = os.path.abspath(db_path)
+
+print(f"Database path: {db_path}")
+
+if not os.path.exists(db_path):
+    print("Database not found!")
+    exit(1)
+
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'asset_variants'")
+if not cursor.fetchone():
+    print("Table asset_variants not created yet; the app creates it with the column")
+else:
+    cursor.execute("PRAGMA table_info(asset_variants)")
+    existing_columns = [row[1] for row in cursor.fetchall()]
+    
+    if 'status' not in existing_columns:
+        print("Adding column: status")
+        # Existing renditions were only recorded once encoded
+        cursor.execute("ALTER TABLE asset_variants ADD COLUMN status VARCHAR(20) NOT NULL DEFAULT 'ready'")
+    else:
+        print("Column already exists: status")
+    
+    # Videos waiting for a transcode no longer count as processing
+    cursor.execute("""
+        UPDATE assets SET status = 'ready'
+        WHERE status = 'processing' AND type = 'video'
+          AND NOT EXISTS (SELECT 1 FROM jobs WHERE jobs.asset_id = assets.id
+                          AND jobs.kind != 'transcode_asset' AND jobs.status IN ('pending', 'running'))
+    """)
+    print(f"Marked {cursor.rowcount} videos awaiting a transcode as ready")
+
+conn.commit()
+conn.close()
+
+print("Migration complete!")
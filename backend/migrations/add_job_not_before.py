@@ -0,0 +1,37 @@
+"""
+Migration script to add the not_before column to jobs (failed jobs are now
+retried after a delay instead of on the next poll)
+"""
+import sqlite3
+import os
+
+# Find the database - it's in the project root, not backend folder
+db_path = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'screensplash.db')
+db_path = os.path.abspath(db_path)
+
+print(f"Database path: {db_path}")
+
+if not os.path.exists(db_path):
+    print("Database not found!")
+    exit(1)
+
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'jobs'")
+if not cursor.fetchone():
+    print("Table jobs not created yet; the app creates it with the column")
+else:
+    cursor.execute("PRAGMA table_info(jobs)")
+    existing_columns = [row[1] for row in cursor.fetchall()]
+    
+    if 'not_before' not in existing_columns:
+        print("Adding column: not_before")
+        cursor.execute("ALTER TABLE jobs ADD COLUMN not_before DATETIME")
+    else:
+        print("Column already exists: not_before")
+
+conn.commit()
+conn.close()
+
+print("Migration complete!")
@@ -0,0 +1,46 @@
+"""
+Migration script to add the denormalized asset_count and total_duration
+columns to playlists and compute them from the playlist items
+"""
+import sqlite3
+import os
+
+# Find the database - it's in the project root, not backend folder
+db_path = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'screensplash.db')
+db_path = os.path.abspath(db_path)
+
+print(f"Database path: {db_path}")
+
+if not os.path.exists(db_path):
+    print("Database not found!")
+    exit(1)
+
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+cursor.execute("PRAGMA table_info(playlists)")
+existing_columns = [row[1] for row in cursor.fetchall()]
+
+for column in ('asset_count', 'total_duration'):
+    if column not in existing_columns:
+        print(f"Adding column: {column}")
+        cursor.execute(f"ALTER TABLE playlists ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+    else:
+        print(f"Column already exists: {column}")
+
+# Same rule as the app: a custom duration of 0 falls back to the asset's
+cursor.execute("""
+    UPDATE playlists SET
+        asset_count = (SELECT COUNT(*) FROM playlist_assets pa WHERE pa.playlist_id = playlists.id),
+        total_duration = (
+            SELECT COALESCE(SUM(COALESCE(NULLIF(pa.custom_duration, 0), a.duration, 0)), 0)
+            FROM playlist_assets pa LEFT JOIN assets a ON a.id = pa.asset_id
+            WHERE pa.playlist_id = playlists.id
+        )
+""")
+print(f"Computed totals for {cursor.rowcount} playlists")
+
+conn.commit()
+conn.close()
+
+print("Migration complete!")
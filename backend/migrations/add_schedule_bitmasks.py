@@ -0,0 +1,89 @@
+"""
+Migration script to add integer day bitmask / minute-of-day columns to
+schedules and playlist_assets, backfilled from the existing string columns
+"""
+import sqlite3
+import os
+
+# Find the database - it's in the project root, not backend folder
+db_path = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'screensplash.db')
+db_path = os.path.abspath(db_path)
+
+print(f"Database path: {db_path}")
+
+if not os.path.exists(db_path):
+    print("Database not found!")
+    exit(1)
+
+
+def days_to_mask(days):
+    mask = 0
+    for day in (days or '').split(','):
+        if day.strip():
+            mask |= 1 << int(day)
+    return mask
+
+
+def time_to_minute(value):
+    # Times are stored as "HH:MM:SS.ffffff" text
+    if not value:
+        return None
+    hours, minutes = value.split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+new_columns = {
+    'schedules': [
+        ('days_mask', 'INTEGER NOT NULL DEFAULT 127'),
+        ('start_minute', 'INTEGER'),
+        ('end_minute', 'INTEGER'),
+    ],
+    'playlist_assets': [
+        ('schedule_days_mask', 'INTEGER'),
+        ('schedule_start_minute', 'INTEGER'),
+        ('schedule_end_minute', 'INTEGER'),
+    ],
+}
+
+for table, columns in new_columns.items():
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing_columns = [row[1] for row in cursor.fetchall()]
+    for col_name, col_type in columns:
+        if col_name not in existing_columns:
+            print(f"Adding column: {table}.{col_name}")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_type}")
+        else:
+            print(f"Column already exists: {table}.{col_name}")
+
+# Backfill from the string columns
+cursor.execute("SELECT id, days_of_week, start_time, end_time FROM schedules")
+rows = cursor.fetchall()
+for row_id, days, start_time, end_time in rows:
+    cursor.execute(
+        "UPDATE schedules SET days_mask = ?, start_minute = ?, end_minute = ? WHERE id = ?",
+        (days_to_mask(days), time_to_minute(start_time), time_to_minute(end_time), row_id)
+    )
+print(f"Backfilled {len(rows)} schedules")
+
+cursor.execute("SELECT id, schedule_days, schedule_start_time, schedule_end_time FROM playlist_assets")
+rows = cursor.fetchall()
+for row_id, days, start_time, end_time in rows:
+    cursor.execute(
+        "UPDATE playlist_assets SET schedule_days_mask = ?, schedule_start_minute = ?, "
+        "schedule_end_minute = ? WHERE id = ?",
+        (days_to_mask(days) or None, time_to_minute(start_time), time_to_minute(end_time), row_id)
+    )
+print(f"Backfilled {len(rows)} playlist items")
+
+cursor.execute(
+    "CREATE INDEX IF NOT EXISTS ix_playlist_assets_playlist_position "
+    "ON playlist_assets (playlist_id, position)"
+)
+
+conn.commit()
+conn.close()
+
+print("Migration complete!")
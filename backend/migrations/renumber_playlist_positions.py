@@ -0,0 +1,42 @@
+"""
+Migration script to spread playlist item positions POSITION_GAP apart, so
+an item can be moved between two others by updating only its own row
+"""
+import sqlite3
+import os
+
+POSITION_GAP = 1024
+
+# Find the database - it's in the project root, not backend folder
+db_path = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'screensplash.db')
+db_path = os.path.abspath(db_path)
+
+print(f"Database path: {db_path}")
+
+if not os.path.exists(db_path):
+    print("Database not found!")
+    exit(1)
+
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+cursor.execute("SELECT id, playlist_id, position FROM playlist_assets ORDER BY playlist_id, position, id")
+playlists = {}
+for item_id, playlist_id, position in cursor.fetchall():
+    playlists.setdefault(playlist_id, []).append((item_id, position))
+
+renumbered = 0
+for playlist_id, items in playlists.items():
+    positions = [position for _, position in items]
+    # Already spread out (e.g. on a re-run): leave the playlist alone
+    if positions[0] >= 1 and all(b - a > 1 for a, b in zip(positions, positions[1:])):
+        continue
+    cursor.executemany("UPDATE playlist_assets SET position = ? WHERE id = ?",
+                       [((index + 1) * POSITION_GAP, item_id) for index, (item_id, _) in enumerate(items)])
+    renumbered += 1
+print(f"Renumbered {renumbered} playlists")
+
+conn.commit()
+conn.close()
+
+print("Migration complete!")
@@ -1,6 +1,20 @@
+try:
+    # Evented serving: idle player event streams then cost a greenlet, not a thread.
+    # Threads become greenlets too; CPU-bound work (Pillow) goes through
+    # background.in_os_thread so it doesn't stall them.
+    from gevent import monkey
+    monkey.patch_all()
+except ImportError:
+    monkey = None
+
 from app import create_app
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    if monkey:
+        from gevent.pywsgi import WSGIServer
+        print("Serving on http://0.0.0.0:5000 (gevent)")
+        WSGIServer(('0.0.0.0', 5000), app).serve_forever()
+    else:
+        app.run(host='0.0.0.0', port=5000, debug=True, threaded=True)
@@ -0,0 +1,32 @@
+"""Upload format sniffing: ISO base media is video unless its brand is an
+image one, and only the WebM flavour of Matroska is accepted."""
+import pytest
+
+from app.media_store import sniff_mime
+
+
+def ftyp(brand):
+    return b'\x00\x00\x00\x18ftyp' + brand + b'\x00\x00\x00\x00isom' + b'\x00' * 40
+
+
+def ebml(doctype):
+    return b'\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01\x42\x82' + bytes([0x80 | len(doctype)]) + doctype
+
+
+@pytest.mark.parametrize('brand', [b'isom', b'mp42', b'3gp4', b'3gp5', b'MSNV', b'mp71', b'dash', b'f4v '])
+def test_video_brands(brand):
+    assert sniff_mime(ftyp(brand)) == 'video/mp4'
+
+
+def test_quicktime():
+    assert sniff_mime(ftyp(b'qt  ')) == 'video/quicktime'
+
+
+@pytest.mark.parametrize('brand', [b'heic', b'mif1', b'avif'])
+def test_image_brands(brand):
+    assert sniff_mime(ftyp(brand)) is None
+
+
+def test_matroska():
+    assert sniff_mime(ebml(b'webm')) == 'video/webm'
+    assert sniff_mime(ebml(b'matroska')) is None
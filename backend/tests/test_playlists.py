@@ -0,0 +1,85 @@
+"""GET /api/playlists must run a fixed number of queries, whatever the size
+of the library (no query per playlist or per item)."""
+import os
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import Asset, Playlist, PlaylistAsset, POSITION_GAP
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('screensplash')
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{folder / 'test.db'}",
+        'UPLOAD_FOLDER': str(folder / 'assets'),
+    })
+    for subfolder in ('images', 'videos', 'thumbnails', 'uploads', 'renditions', 'sprites'):
+        os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], subfolder), exist_ok=True)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def add_playlists(app, count, items):
+    """Add ``count`` playlists of ``items`` assets each."""
+    with app.app_context():
+        for index in range(count):
+            playlist = Playlist(name=f"Playlist {index}")
+            db.session.add(playlist)
+            for position in range(items):
+                asset = Asset(name=f"Asset {index}-{position}", type='url',
+                              path='http://example.com', duration=10)
+                db.session.add(PlaylistAsset(playlist=playlist, asset=asset,
+                                             position=POSITION_GAP * (position + 1)))
+        db.session.commit()
+
+
+def count_queries(app, client, url):
+    """Statements run while serving ``url`` (the background writers are not counted)."""
+    statements = []
+    thread = threading.get_ident()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return len(statements), response.get_json()['playlists']
+
+
+@pytest.mark.parametrize('url', ['/api/playlists', '/api/playlists?include_assets=true'])
+def test_playlist_listing_query_count_is_bounded(app, url):
+    client = app.test_client()
+
+    add_playlists(app, 2, 2)
+    small_count, playlists = count_queries(app, client, url)
+    assert len(playlists) >= 2
+
+    add_playlists(app, 10, 5)
+    large_count, playlists = count_queries(app, client, url)
+    assert len(playlists) >= 12
+
+    assert large_count == small_count
+
+
+def test_playlist_listing_totals(app):
+    client = app.test_client()
+    add_playlists(app, 1, 3)
+
+    playlists = client.get('/api/playlists?include_assets=true').get_json()['playlists']
+    newest = playlists[0]
+    assert newest['asset_count'] == 3
+    assert newest['total_duration'] == 30
+    assert len(newest['assets']) == 3
@@ -17,6 +17,26 @@ import {
 
 import { assetsApi } from '../services/api';
 
+// Thumbnails per sprite sheet request (the server caps a sheet at 200)
+const SPRITE_BATCH = 100;
+
+// One tile of a sprite sheet, cropped like an <img> with object-fit: cover
+function SpriteThumbnail({ sprite, style }) {
+    const col = sprite.index % sprite.columns;
+    const row = Math.floor(sprite.index / sprite.columns);
+    return (
+        <div style={{
+            height: '100%',
+            aspectRatio: '16 / 9',
+            flexShrink: 0,
+            backgroundImage: `url(${sprite.url})`,
+            backgroundSize: `${sprite.columns * 100}% ${sprite.rows * 100}%`,
+            backgroundPosition: `${sprite.columns > 1 ? col / (sprite.columns - 1) * 100 : 0}% ${sprite.rows > 1 ? row / (sprite.rows - 1) * 100 : 0}%`,
+            ...style
+        }} />
+    );
+}
+
 function AssetManager() {
     const [assets, setAssets] = useState([]);
     const [loading, setLoading] = useState(true);
@@ -28,18 +48,29 @@ function AssetManager() {
     const [previewAsset, setPreviewAsset] = useState(null);
     const [editingAsset, setEditingAsset] = useState(null);
     const [dragOver, setDragOver] = useState(false);
+    const [sprites, setSprites] = useState({});
     const fileInputRef = useRef(null);
 
     useEffect(() => {
         fetchAssets();
     }, [filterType]);
 
+    // Thumbnails are generated in the background: refresh until they are done
+    useEffect(() => {
+        if (!assets.some(asset => asset.status === 'processing')) return;
+        const timer = setTimeout(fetchAssets, 3000);
+        return () => clearTimeout(timer);
+    }, [assets]);
+
     const fetchAssets = async () => {
         try {
             const params = { per_page: 100 };
             if (filterType !== 'all') params.type = filterType;
             const res = await assetsApi.getAll(params);
-            setAssets(res.data.assets || []);
+            const list = res.data.assets || [];
+            // Sprites first, so the grid doesn't fall back to one request per tile
+            setSprites(await fetchSprites(list));
+            setAssets(list);
         } catch (error) {
             console.error('Error fetching assets:', error);
         } finally {
@@ -47,6 +78,24 @@ function AssetManager() {
         }
     };
 
+    // One sprite sheet per batch instead of one thumbnail request per tile
+    const fetchSprites = async (list) => {
+        const ids = list.filter(asset => asset.thumbnail_path).map(asset => asset.id);
+        const next = {};
+        try {
+            for (let i = 0; i < ids.length; i += SPRITE_BATCH) {
+                const res = await assetsApi.getThumbnailSprite(ids.slice(i, i + SPRITE_BATCH));
+                const { sprite, columns, rows, items } = res.data;
+                Object.entries(items).forEach(([id, index]) => {
+                    next[id] = { url: sprite, index, columns, rows };
+                });
+            }
+        } catch (error) {
+            console.error('Error fetching thumbnail sprites:', error);
+        }
+        return next;
+    };
+
     const broadcastChange = () => {
         const syncChannel = new BroadcastChannel('screensplash_sync');
         syncChannel.postMessage('data_updated');
@@ -247,7 +296,9 @@ function AssetManager() {
                         {filteredAssets.map(asset => (
                             <div key={asset.id} className="asset-card">
                                 <div className="asset-thumbnail">
-                                    {asset.thumbnail_path ? (
+                                    {sprites[asset.id] ? (
+                                        <SpriteThumbnail sprite={sprites[asset.id]} style={{ width: '100%' }} />
+                                    ) : asset.thumbnail_path ? (
                                         <img src={assetsApi.getThumbnail(asset.id)} alt={asset.name} />
                                     ) : asset.type === 'video' ? (
                                         <div className="asset-placeholder video">
@@ -271,7 +322,10 @@ function AssetManager() {
                                     <span className="asset-type-badge">{asset.type}</span>
                                 </div>
                                 <div className="asset-info">
-                                    <div className="asset-name">{asset.name}</div>
+                                    <div className="asset-name">
+                                        {asset.name}
+                                        {asset.status === 'processing' && ' (traitement…)'}
+                                    </div>
                                     <div className="asset-meta">
                                         {formatDuration(asset.duration)}
                                     </div>
@@ -333,7 +387,9 @@ function AssetManager() {
                                                         justifyContent: 'center',
                                                         overflow: 'hidden'
                                                     }}>
-                                                        {asset.type === 'image' && asset.thumbnail_path ? (
+                                                        {asset.type === 'image' && sprites[asset.id] ? (
+                                                            <SpriteThumbnail sprite={sprites[asset.id]} />
+                                                        ) : asset.type === 'image' && asset.thumbnail_path ? (
                                                             <img src={assetsApi.getThumbnail(asset.id)} alt="" style={{ width: '100%', height: '100%', objectFit: 'cover' }} />
                                                         ) : (
                                                             getTypeIcon(asset.type)
@@ -16,6 +16,7 @@ function Dashboard() {
     const [systemStatus, setSystemStatus] = useState(null);
     const [systemInfo, setSystemInfo] = useState(null);
     const [logs, setLogs] = useState([]);
+    const [weekActivity, setWeekActivity] = useState(0);
     const [stats, setStats] = useState({ assets: 0, playlists: 0 });
     const [loading, setLoading] = useState(true);
 
@@ -41,10 +42,11 @@ function Dashboard() {
 
     const fetchData = async () => {
         try {
-            const [statusRes, infoRes, logsRes, assetsRes, playlistsRes] = await Promise.all([
+            const [statusRes, infoRes, logsRes, dailyRes, assetsRes, playlistsRes] = await Promise.all([
                 systemApi.getStatus(),
                 systemApi.getInfo(),
                 systemApi.getLogs(10),
+                systemApi.getLogsDaily(7),
                 assetsApi.getAll({ per_page: 1 }),
                 playlistsApi.getAll()
             ]);
@@ -52,6 +54,7 @@ function Dashboard() {
             setSystemStatus(statusRes.data);
             setSystemInfo(infoRes.data);
             setLogs(logsRes.data.logs || []);
+            setWeekActivity(dailyRes.data.total || 0);
             setStats({
                 assets: assetsRes.data.total || 0,
                 playlists: playlistsRes.data.playlists?.length || 0
@@ -318,6 +321,9 @@ function Dashboard() {
                     <div className="card">
                         <div className="card-header">
                             <h3 className="card-title">Activité Récente</h3>
+                            <span style={{ color: 'var(--color-text-muted)', fontSize: '0.875rem' }}>
+                                {weekActivity} action{weekActivity !== 1 ? 's' : ''} sur 7 jours
+                            </span>
                         </div>
                         <div className="card-body" style={{ maxHeight: '300px', overflowY: 'auto' }}>
                             {logs.length === 0 ? (
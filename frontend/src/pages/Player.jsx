@@ -3,6 +3,22 @@ import { playerApi, systemApi } from '../services/api';
 import InfoPage from '../components/InfoPage';
 import { Maximize, Minimize } from 'lucide-react';
 
+const PLAYER_VERSION = '1.0.0';
+const HEARTBEAT_INTERVAL = 30000;
+
+// Stable id this screen reports under (and is served renditions for)
+const getScreenId = () => {
+    let screenId = localStorage.getItem('screensplash_screen_id');
+    if (!screenId) {
+        screenId = `screen-${Math.random().toString(36).slice(2, 10)}`;
+        localStorage.setItem('screensplash_screen_id', screenId);
+    }
+    return screenId;
+};
+
+const mediaUrl = (item) =>
+    `${item.url || `/api/assets/${item.asset_id}/file`}?screen=${encodeURIComponent(getScreenId())}`;
+
 function Player() {
     const [currentItem, setCurrentItem] = useState(null);
     const [nextItem, setNextItem] = useState(null);
@@ -23,10 +39,12 @@ function Player() {
     const videoRef = useRef(null);
     const timerRef = useRef(null);
     const pollRef = useRef(null);
-    const managementPollRef = useRef(null);
+    const managementSourceRef = useRef(null);
+    const boundaryTimerRef = useRef(null);
     const lastRefreshToken = useRef(null);
     const lastCommandTime = useRef(null);
     const itemsRef = useRef([]);
+    const currentItemRef = useRef(null);
 
     // Kiosk state
     const [showControls, setShowControls] = useState(false);
@@ -80,6 +98,24 @@ function Player() {
         }
     }, []);
 
+    // Refetch exactly when the schedule says the content changes
+    const scheduleBoundaryRefresh = useCallback(async () => {
+        try {
+            const res = await playerApi.getTimeline(24);
+            if (boundaryTimerRef.current) clearTimeout(boundaryTimerRef.current);
+            const nextChange = res.data.next_change;
+            if (nextChange) {
+                const delay = Math.max(new Date(nextChange) - Date.now(), 0) + 500;
+                boundaryTimerRef.current = setTimeout(() => {
+                    fetchContent();
+                    scheduleBoundaryRefresh();
+                }, delay);
+            }
+        } catch (err) {
+            console.error('Error fetching timeline:', err);
+        }
+    }, [fetchContent]);
+
     // Advance to next item
     const advanceToNext = useCallback(() => {
         setCurrentIndex(prev => {
@@ -93,6 +129,7 @@ function Player() {
         fetchConfig();
         fetchContent();
         fetchWidgets();
+        scheduleBoundaryRefresh();
 
         pollRef.current = setInterval(() => {
             fetchContent();
@@ -100,47 +137,72 @@ function Player() {
             fetchWidgets();
         }, 60000); // Poll every minute
 
-        // Live Management Polling (Refresh & Remote Control)
-        managementPollRef.current = setInterval(async () => {
-            try {
-                const res = await systemApi.getConfig();
-                const remoteConfig = res.data.config;
-                if (!remoteConfig) return;
-
-                // 1. Check for Refresh
-                const refreshToken = remoteConfig.player_refresh_token;
-                if (refreshToken && refreshToken !== lastRefreshToken.current) {
-                    lastRefreshToken.current = refreshToken;
-                    fetchContent();
-                    fetchConfig();
-                    fetchWidgets();
+        // Live Management (Refresh & Remote Control), pushed by the server
+        const handleManagementState = (state) => {
+            // 1. Check for Refresh
+            const refreshToken = state.refresh_token;
+            if (refreshToken && refreshToken !== lastRefreshToken.current) {
+                lastRefreshToken.current = refreshToken;
+                fetchContent();
+                fetchConfig();
+                fetchWidgets();
+                scheduleBoundaryRefresh();
+            }
+
+            // 2. Check for Commands
+            const command = state.command;
+            const commandTime = state.command_time;
+            if (command && command !== 'none' && commandTime && commandTime !== lastCommandTime.current) {
+                lastCommandTime.current = commandTime;
+                if (command === 'next') advanceToNext();
+                if (command === 'prev') {
+                    setCurrentIndex(prev => {
+                        if (itemsRef.current.length <= 1) return prev;
+                        return (prev - 1 + itemsRef.current.length) % itemsRef.current.length;
+                    });
                 }
+                if (command === 'refresh') fetchContent();
+            }
+        };
 
-                // 2. Check for Commands
-                const command = remoteConfig.player_command;
-                const commandTime = remoteConfig.player_command_time;
-                if (command && command !== 'none' && commandTime && commandTime !== lastCommandTime.current) {
-                    lastCommandTime.current = commandTime;
-                    if (command === 'next') advanceToNext();
-                    if (command === 'prev') {
-                        setCurrentIndex(prev => {
-                            if (itemsRef.current.length <= 1) return prev;
-                            return (prev - 1 + itemsRef.current.length) % itemsRef.current.length;
-                        });
+        if (typeof EventSource !== 'undefined') {
+            // EventSource reconnects on its own and resumes from the last event id
+            const events = new EventSource('/api/player/events');
+            events.addEventListener('sync', (e) => {
+                try {
+                    handleManagementState(JSON.parse(e.data));
+                } catch (err) {
+                    console.error('Management event error:', err);
+                }
+            });
+            managementSourceRef.current = events;
+        } else {
+            // Fallback: long-poll the versioned sync endpoint
+            let active = true;
+            let version;
+            const poll = async () => {
+                while (active) {
+                    try {
+                        const res = await playerApi.sync(version, 25);
+                        version = res.data.version;
+                        if (res.data.changed) handleManagementState(res.data);
+                    } catch (err) {
+                        console.error('Management sync error:', err);
+                        await new Promise(resolve => setTimeout(resolve, 2000));
                     }
-                    if (command === 'refresh') fetchContent();
                 }
-            } catch (err) {
-                console.error('Management poll error:', err);
-            }
-        }, 2000);
+            };
+            poll();
+            managementSourceRef.current = { close: () => { active = false; } };
+        }
 
         return () => {
             if (pollRef.current) clearInterval(pollRef.current);
-            if (managementPollRef.current) clearInterval(managementPollRef.current);
+            if (managementSourceRef.current) managementSourceRef.current.close();
             if (timerRef.current) clearTimeout(timerRef.current);
+            if (boundaryTimerRef.current) clearTimeout(boundaryTimerRef.current);
         };
-    }, [fetchContent, fetchConfig, fetchWidgets, advanceToNext]);
+    }, [fetchContent, fetchConfig, fetchWidgets, scheduleBoundaryRefresh, advanceToNext]);
 
     // Handle item changes and true cross-fading layers
     const currentLayer = currentIndex % 2;
@@ -161,6 +223,34 @@ function Player() {
         }
     }, [items, currentIndex, currentLayer]);
 
+    // Heartbeat for the server's screen registry
+    useEffect(() => {
+        currentItemRef.current = currentItem;
+    }, [currentItem]);
+
+    useEffect(() => {
+        const screenId = getScreenId();
+
+        const sendHeartbeat = async () => {
+            const item = currentItemRef.current;
+            const ratio = window.devicePixelRatio || 1;
+            try {
+                await playerApi.updateStatus({
+                    screen_id: screenId,
+                    current_item: item ? { id: item.id, asset_id: item.asset_id } : null,
+                    resolution: `${Math.round(window.screen.width * ratio)}x${Math.round(window.screen.height * ratio)}`,
+                    version: PLAYER_VERSION
+                });
+            } catch (err) {
+                console.error('Heartbeat error:', err);
+            }
+        };
+
+        sendHeartbeat();
+        const heartbeat = setInterval(sendHeartbeat, HEARTBEAT_INTERVAL);
+        return () => clearInterval(heartbeat);
+    }, []);
+
     // Handle auto-advancement
     useEffect(() => {
         if (!currentItem) return;
@@ -331,7 +421,7 @@ function Player() {
                         {layers.map((layerItem, idx) => (
                             <div key={`layer-${idx}`} style={getTransitionStyle(idx)}>
                                 {layerItem && layerItem.type === 'image' && (
-                                    <img src={layerItem.url || `/api/assets/${layerItem.asset_id}/file`} alt=""
+                                    <img src={mediaUrl(layerItem)} alt=""
                                         style={{
                                             maxWidth: '100%',
                                             maxHeight: '100%',
@@ -344,7 +434,7 @@ function Player() {
                                 {layerItem && layerItem.type === 'video' && (
                                     <video 
                                         ref={idx === currentLayer ? videoRef : null} 
-                                        src={layerItem.url || `/api/assets/${layerItem.asset_id}/file`}
+                                        src={mediaUrl(layerItem)}
                                         autoPlay={idx === currentLayer}
                                         muted={idx !== currentLayer}
                                         onEnded={idx === currentLayer ? handleVideoEnd : undefined} 
@@ -202,10 +202,9 @@ function PlaylistEditor() {
         setPlaylistAssets(newOrder);
 
         try {
-            await playlistsApi.reorderAssets(
-                selectedPlaylist.id,
-                newOrder.map(pa => pa.id)
-            );
+            // Only the dragged item changes position on the server
+            const after = newActiveOrder[newIndex - 1];
+            await playlistsApi.moveAsset(selectedPlaylist.id, active.id, after ? after.id : null);
             broadcastChange();
         } catch (error) {
             console.error('Error reordering:', error);
@@ -20,7 +20,18 @@ export const assetsApi = {
     update: (id, data) => api.put(`/assets/${id}`, data),
     delete: (id) => api.delete(`/assets/${id}`),
     getFile: (id) => `${API_BASE}/assets/${id}/file`,
-    getThumbnail: (id) => `${API_BASE}/assets/${id}/thumbnail`
+    getThumbnail: (id) => `${API_BASE}/assets/${id}/thumbnail`,
+    getThumbnailSprite: (ids) => api.get('/assets/thumbnails/sprite', { params: { ids: ids.join(',') } }),
+    // Chunked, resumable uploads
+    createUpload: (data) => api.post('/assets/uploads', data),
+    getUpload: (uploadId) => api.get(`/assets/uploads/${uploadId}`),
+    putChunk: (uploadId, index, offset, blob) =>
+        api.put(`/assets/uploads/${uploadId}/chunks/${index}`, blob, {
+            params: { offset },
+            headers: { 'Content-Type': 'application/octet-stream' }
+        }),
+    completeUpload: (uploadId) => api.post(`/assets/uploads/${uploadId}/complete`),
+    abortUpload: (uploadId) => api.delete(`/assets/uploads/${uploadId}`)
 };
 
 // Playlists API
@@ -42,6 +53,8 @@ export const playlistsApi = {
         api.delete(`/playlists/${playlistId}/assets/${playlistAssetId}`),
     reorderAssets: (id, order) =>
         api.put(`/playlists/${id}/assets/reorder`, { order }),
+    moveAsset: (playlistId, playlistAssetId, afterId) =>
+        api.put(`/playlists/${playlistId}/assets/${playlistAssetId}/move`, { after_id: afterId }),
     updateAsset: (playlistId, playlistAssetId, data) =>
         api.put(`/playlists/${playlistId}/assets/${playlistAssetId}`, data)
 };
@@ -60,7 +73,8 @@ export const schedulesApi = {
 export const systemApi = {
     getStatus: () => api.get('/system/status'),
     getInfo: () => api.get('/system/info'),
-    getLogs: (limit = 50) => api.get('/system/logs', { params: { limit } }),
+    getLogs: (limit = 50, cursor = null) => api.get('/system/logs', { params: { limit, cursor } }),
+    getLogsDaily: (days = 30, action = null) => api.get('/system/logs/daily', { params: { days, action } }),
     getConfig: () => api.get('/system/config'),
     updateConfig: (data) => api.put('/system/config', data),
     health: () => api.get('/system/health')
@@ -69,9 +83,18 @@ export const systemApi = {
 // Player API
 export const playerApi = {
     getCurrent: () => api.get('/player/current'),
-    getNext: (playlistId, currentPosition) =>
-        api.get('/player/next', { params: { playlist_id: playlistId, current: currentPosition } }),
-    updateStatus: (data) => api.post('/player/status', data)
+    getTimeline: (hours = 24) => api.get('/player/timeline', { params: { hours } }),
+    getPreload: (playlistId, fromPosition, count = 5, screenId = undefined) =>
+        api.get('/player/preload', { params: { playlist_id: playlistId, from: fromPosition, count, screen: screenId } }),
+    updateStatus: (data) => api.post('/player/status', data),
+    getScreens: () => api.get('/player/screens'),
+    sync: (since, wait = 0) => api.get('/player/sync', { params: { since, wait } })
+};
+
+// Batch API: several playlist/asset/schedule calls applied all together or not at all
+// operations: [{ method: 'PUT', path: '/api/playlists/1', body: { ... } }, ...]
+export const batchApi = {
+    run: (operations) => api.post('/batch', { operations })
 };
 
 export default api;
@@ -28,4 +28,10 @@ echo "🔄 Déploiement des fichiers..."
 rm -rf ../backend/static/*
 cp -r dist/* ../backend/static/
 
+echo "🗄️ Migration de la base de données..."
+cd ../backend
+for migration in add_schedule_columns add_schedule_bitmasks add_asset_content_hash add_asset_status add_asset_media_info add_asset_listing_indexes add_playlist_totals renumber_playlist_positions add_activity_log_rollup add_asset_variant_status add_job_not_before; do
+    venv/bin/python "migrations/$migration.py"
+done
+
 echo "✅ Mise à jour préparée avec succès !"